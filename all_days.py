@@ -1,25 +1,101 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+import traceback
+import solution_cache
 
-nb_days = 9
-days = [__import__("day%d" % i) for i in range(1, nb_days + 1)]
+day_file_re = re.compile(r"^day(\d+)\.py$")
 
 
-def run_tests():
-    print("Unit-tests")
-    for day in days:
-        print("-", day.__name__)
-        day.run_tests()
-    print()
+def get_days(directory=os.path.dirname(os.path.abspath(__file__))):
+    """Return numbers of the dayN.py modules, in order."""
+    return sorted(
+        int(m.group(1)) for m in map(day_file_re.match, os.listdir(directory)) if m
+    )
+
+
+def run_day(day, tests=True, solutions=True, force=False):
+    """Run tests and/or solutions of a day, return day, output, wall time
+    in seconds and whether it went fine. The module is only imported here.
+    Solutions come from the cache unless force is set."""
+    output = io.StringIO()
+    begin = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            module = __import__("day%d" % day)
+            if tests:
+                module.run_tests()
+            if solutions:
+                cache = solution_cache.solution_cache
+                for answer in cache.get_answers(module, force):
+                    print(answer)
+        ok = True
+    except Exception:
+        output.write(traceback.format_exc())
+        ok = False
+    return day, output.getvalue(), time.perf_counter() - begin, ok
+
+
+def run_days(days, workers=None, tests=True, solutions=True, force=False):
+    """Yield results of run_day for the days, each in its own worker,
+    as soon as they are available. A single day (or worker) is run in
+    this process: no pool to start."""
+    if len(days) == 1 or workers == 1:
+        for day in days:
+            yield run_day(day, tests, solutions, force)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(run_day, day, tests, solutions, force) for day in days
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+
+def format_timings(results, wall_time):
+    lines = ["Day  Status     Time"]
+    for day, _, seconds, ok in sorted(results, key=lambda r: r[2], reverse=True):
+        lines.append("%3d  %-6s %8.3fs" % (day, "ok" if ok else "FAILED", seconds))
+    lines.append("Sum of days: %.3fs" % sum(r[2] for r in results))
+    lines.append("Wall time:   %.3fs" % wall_time)
+    return "\n".join(lines)
 
 
-def get_solutions():
-    print("Actual solutions")
+def main():
+    parser = argparse.ArgumentParser(description="Run the dayN.py modules")
+    parser.add_argument("days", nargs="*", type=int, help="default: all days")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--tests-only", action="store_true")
+    group.add_argument("--solutions-only", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="recompute cached solutions"
+    )
+    args = parser.parse_args()
+    all_days = get_days()
+    days = args.days or all_days
     for day in days:
-        print("-", day.__name__)
-        day.get_solutions()
-    print()
+        if day not in all_days:
+            parser.error("no day%d.py" % day)
+    begin = time.perf_counter()
+    results = []
+    for result in run_days(
+        days, args.workers, not args.solutions_only, not args.tests_only, args.force
+    ):
+        day, output, seconds, ok = result
+        print("- day%d" % day)
+        print(output)
+        results.append(result)
+    print(format_timings(results, time.perf_counter() - begin))
+    if not all(ok for _, _, _, ok in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    run_tests()
-    get_solutions()
+    main()
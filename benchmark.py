@@ -0,0 +1,130 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+
+
+def time_calls(func, warmup=1, repeat=5, max_time=1.0):
+    """Call func warmup times, then repeat times (at least once, stopping
+    earlier once max_time seconds are spent). Return value of the calls
+    (which must all be equal) and timings in nanoseconds."""
+    results = [func() for _ in range(warmup)]
+    timings, total = [], 0
+    for _ in range(max(1, repeat)):
+        begin = time.perf_counter_ns()
+        results.append(func())
+        timings.append(time.perf_counter_ns() - begin)
+        total += timings[-1]
+        if total >= max_time * 1e9:
+            break
+    assert all(result == results[0] for result in results), results
+    return results[0], timings
+
+
+def get_stats(timings):
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "min_ns": timings[0],
+        "median_ns": int(statistics.median(timings)),
+        "p95_ns": timings[math.ceil(0.95 * len(timings)) - 1],
+    }
+
+
+def benchmark(run_tests, get_parts, warmup=1, repeat=5, max_time=1.0, show=print):
+    """Return statistics by stage: tests, input (calling get_parts, which
+    reads the input and returns a function per part) then part1, part2...
+    show is called with the answer of each part."""
+    stats = dict()
+    _, timings = time_calls(run_tests, warmup, repeat, max_time)
+    stats["tests"] = get_stats(timings)
+    # Parts are new functions at each call: compared by number only
+    _, timings = time_calls(lambda: len(get_parts()), warmup, repeat, max_time)
+    stats["input"] = get_stats(timings)
+    for i, part in enumerate(get_parts(), 1):
+        answer, timings = time_calls(part, warmup, repeat, max_time)
+        show(answer)
+        stats["part%d" % i] = get_stats(timings)
+    return stats
+
+
+def format_stats(stats):
+    lines = ["Stage     Runs        Min     Median        p95"]
+    for stage, s in stats.items():
+        lines.append(
+            "%-7s %6d %9.3fms %9.3fms %9.3fms"
+            % (
+                stage,
+                s["runs"],
+                s["min_ns"] / 1e6,
+                s["median_ns"] / 1e6,
+                s["p95_ns"] / 1e6,
+            )
+        )
+    return "\n".join(lines)
+
+
+def get_machine_info():
+    return {
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main(run_tests, get_parts, argv=None):
+    """Entry point of the dayN.py modules: print answers and timings."""
+    parser = argparse.ArgumentParser(description="Run tests and solutions, timed")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs at most")
+    parser.add_argument(
+        "--max-time", type=float, default=1.0, help="seconds of timed runs by stage"
+    )
+    parser.add_argument("--json", action="store_true", help="timings as JSON only")
+    args = parser.parse_args(argv)
+    show = (lambda answer: None) if args.json else print
+    stats = benchmark(
+        run_tests, get_parts, args.warmup, args.repeat, args.max_time, show
+    )
+    if args.json:
+        name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        result = {"name": name, "machine": get_machine_info(), "stages": stats}
+        print(json.dumps(result, indent=2))
+    else:
+        print(format_stats(stats))
+
+
+def run_tests():
+    timings = [5, 1, 4, 2, 3]
+    assert get_stats(timings) == {"runs": 5, "min_ns": 1, "median_ns": 3, "p95_ns": 5}
+    assert get_stats(range(1, 101))["p95_ns"] == 95
+    calls = []
+    result, timings = time_calls(lambda: calls.append(0) or 42, warmup=2, repeat=3)
+    assert result == 42 and len(timings) == 3 and len(calls) == 5
+    # Stops once the time is spent, with one timed run at least
+    _, timings = time_calls(lambda: time.sleep(0.01), warmup=0, repeat=100, max_time=0)
+    assert len(timings) == 1 and timings[0] >= 10**7
+    answers = []
+    stats = benchmark(
+        lambda: None, lambda: [lambda: 1, lambda: "2"], repeat=2, show=answers.append
+    )
+    assert answers == [1, "2"]
+    assert list(stats) == ["tests", "input", "part1", "part2"]
+    assert all(s["runs"] == 2 for s in stats.values())
+    # Part giving different answers (input modified by the part for instance)
+    raised = False
+    try:
+        time_calls(iter(range(10)).__next__)
+    except AssertionError:
+        raised = True
+    assert raised
+
+
+if __name__ == "__main__":
+    main(run_tests, lambda: [])
@@ -1,10 +1,10 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
+import benchmark
+import input_files
 
 
 def get_modules_from_file(file_path="day1_input.txt"):
-    with open(file_path) as f:
-        return [int(l.strip()) for l in f]
+    return [int(l) for l in input_files.iter_lines(file_path)]
 
 
 def get_fuel_requirement(weight):
@@ -35,15 +35,18 @@ def run_tests():
     assert get_full_fuel_requirement2(modules) == 2 + 2 + 966 + 50346
 
 
-def get_solutions():
+def get_parts():
     modules = get_modules_from_file()
-    print(get_full_fuel_requirement(modules))
-    print(get_full_fuel_requirement2(modules))
+    return (
+        lambda: get_full_fuel_requirement(modules),
+        lambda: get_full_fuel_requirement2(modules),
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,11 +1,11 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import math
+import benchmark
+import input_files
 
 
 def get_grid_from_file(file_path="day10_input.txt"):
-    with open(file_path) as f:
-        return [l.strip() for l in f]
+    return list(input_files.iter_lines(file_path))
 
 
 def get_asteroids(grid):
@@ -125,16 +125,21 @@ def run_tests():
     assert vaporise(grid2, p2, 200) == 802
 
 
-def get_solutions():
+def get_parts():
     grid = get_grid_from_file()
-    count, p = get_best_asteroid_count(grid)
-    print(count)
-    print(vaporise(grid, p, 200))
+
+    def part2():
+        # Station found again: each part is timed on its own
+        _, p = get_best_asteroid_count(grid)
+        return vaporise(grid, p, 200)
+
+    return lambda: get_best_asteroid_count(grid)[0], part2
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,9 +1,10 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import itertools
 import operator
 import math
 import functools
+import benchmark
+import input_files
 
 
 def get_pos_from_str(s):
@@ -13,8 +14,7 @@ def get_pos_from_str(s):
 
 
 def get_pos_from_file(file_path="day12_input.txt"):
-    with open(file_path) as f:
-        return [get_pos_from_str(l.strip()) for l in f]
+    return [get_pos_from_str(l) for l in input_files.iter_lines(file_path)]
 
 
 def vect_bin_op(op):
@@ -102,15 +102,15 @@ def run_tests():
     assert simulation2(pos2) == 4686774924
 
 
-def get_solutions():
+def get_parts():
     pos = get_pos_from_file()
-    print(simulation(pos, 1000))
-    print(simulation2(pos))
+    return lambda: simulation(pos, 1000), lambda: simulation2(pos)
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,8 +1,9 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import collections
 import fractions
 import math
+import benchmark
+import input_files
 
 
 def get_quantity_and_chemical(s):
@@ -20,8 +21,8 @@ def get_reaction_from_line(l):
 
 
 def get_reactions_from_file(file_path="day14_input.txt"):
-    with open(file_path) as f:
-        return [get_reaction_from_line(l) for l in f]
+    lines = input_files.iter_lines(file_path, strip=False)
+    return [get_reaction_from_line(l) for l in lines]
 
 
 def apply_reaction(products, reaction_by_output, integer_recipe):
@@ -138,15 +139,18 @@ def run_tests():
     assert max_fuel_prod(reactions) == 460664
 
 
-def get_solutions():
+def get_parts():
     reactions = get_reactions_from_file()
-    print(ore_to_make_product(reactions))
-    print(max_fuel_prod(reactions))
+    return (
+        lambda: ore_to_make_product(reactions),
+        lambda: max_fuel_prod(reactions),
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,12 +1,12 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import string
 import heapq
 import collections
+import benchmark
+import input_files
 
 def get_maze_from_file(file_path="day18_input.txt"):
-    with open(file_path) as f:
-        return [l.strip() for l in f]
+    return list(input_files.iter_lines(file_path))
 
 def is_entrance(c):
     return c == "@"
@@ -138,14 +138,16 @@ def run_tests():
     assert get_all_keys(maze) == 81
 
 
-def get_solutions():
+def get_parts():
     maze = get_maze_from_file()
-    # Too slow: print(get_all_keys(maze))
+    # Too slow: lambda: get_all_keys(maze)
+    return ()
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
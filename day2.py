@@ -1,10 +1,14 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import int_code
+import int_code_symbolic
+import benchmark
 
 
 def run_tests():
     int_code.run_tests_day2()
+    # Noun and verb used as addresses: not solved symbolically
+    intcode = [1, 0, 0, 0, 1005, 0, 9, 99, 0, 99, 19690000, 720]
+    assert part2(intcode) == part2_brute_force(intcode) == 1110
 
 
 def part1(intcode):
@@ -15,22 +19,35 @@ def part1(intcode):
     return intcode[0]
 
 
-def part2(intcode):
+def part2_brute_force(intcode):
     for verb in range(99 + 1):
         for noun in range(99 + 1):
             if int_code.run_verb_noun(intcode, noun, verb) == 19690720:
                 return 100 * noun + verb
 
 
-def get_solutions():
+def part2(intcode):
+    # Position 0 is a polynomial in noun and verb: solve it instead of trying all
+    try:
+        final, _ = int_code_symbolic.run_symbolic(intcode, {1: "noun", 2: "verb"})
+        ranges = {"noun": range(99 + 1), "verb": range(99 + 1)}
+        for sol in int_code_symbolic.solve(final[0], 19690720, ranges):
+            assert int_code.run_verb_noun(intcode, sol["noun"], sol["verb"]) == 19690720
+            return 100 * sol["noun"] + sol["verb"]
+    except int_code_symbolic.SymbolicError:
+        pass  # Noun or verb used for control flow or as an address
+    return part2_brute_force(intcode)
+
+
+def get_parts():
     intcode = int_code.get_intcode_from_file("day2_input.txt")
-    print(part1(intcode))
-    print(part2(intcode))
+    return lambda: part1(intcode), lambda: part2(intcode)
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,14 +1,14 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import string
 import collections
 import itertools
 import heapq
+import benchmark
+import input_files
 
 
 def get_grid_from_file(file_path="day20_input.txt"):
-    with open(file_path) as f:
-        return [l for l in f]
+    return list(input_files.iter_lines(file_path, strip=False))
 
 
 def points_iter(grid):
@@ -291,15 +291,15 @@ def run_tests():
     assert solve_maze2(grid) == 396
 
 
-def get_solutions():
+def get_parts():
     grid = get_grid_from_file()
-    print(solve_maze(grid))
-    print(solve_maze2(grid))
+    return lambda: solve_maze(grid), lambda: solve_maze2(grid)
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,13 +1,13 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import math
 import functools
 import collections
+import benchmark
+import input_files
 
 
 def get_orders_from_file(file_path="day22_input.txt"):
-    with open(file_path) as f:
-        return [l.strip() for l in f]
+    return list(input_files.iter_lines(file_path))
 
 
 # Note: Many functions here are basic implementations
@@ -360,15 +360,16 @@ def part2(orders):
     return apply_modular_reversed_orders(orders, nb_cards, final_position, nb_shuffle)
 
 
-def get_solutions():
+def get_parts():
     orders = get_orders_from_file()
-    print(part1(orders))
-    # print(part2(orders)) - not fast enough >_<
+    # lambda: part2(orders) - not fast enough >_<
+    return (lambda: part1(orders),)
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,6 +1,7 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import collections
+import benchmark
+import input_files
 
 size = 5
 
@@ -21,8 +22,8 @@ def get_bugs_from_lines(lines, make_point_func=make_point):
 
 
 def get_bugs_from_file(file_path="day24_input.txt", make_point_func=make_point):
-    with open(file_path) as f:
-        return set(get_bugs_from_lines(f, make_point_func))
+    lines = input_files.iter_lines(file_path, strip=False)
+    return set(get_bugs_from_lines(lines, make_point_func))
 
 
 def show_bugs(bugs):
@@ -177,18 +178,19 @@ def run_tests():
     run_tests_part2()
 
 
-def get_solutions():
-    # Part 1
+def get_parts():
     bugs = get_bugs_from_file()
-    print(first_repeated_layout(bugs))
-    # Part 2
-    bugs = get_bugs_from_file(make_point_func=make_point3d)
-    print(len(get_bugs_after_n_generations(bugs, 200, neighbours3d)))
+    bugs3d = get_bugs_from_file(make_point_func=make_point3d)
+    return (
+        lambda: first_repeated_layout(bugs),
+        lambda: len(get_bugs_after_n_generations(bugs3d, 200, neighbours3d)),
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
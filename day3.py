@@ -1,10 +1,10 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
+import benchmark
+import input_files
 
 
 def get_wires_from_file(file_path="day3_input.txt"):
-    with open(file_path) as f:
-        return [l.strip() for l in f]
+    return list(input_files.iter_lines(file_path))
 
 
 directions = {
@@ -54,15 +54,18 @@ def run_tests():
     assert get_crossing_min_delay(wires) == 610
 
 
-def get_solutions():
+def get_parts():
     wires = get_wires_from_file()
-    print(get_crossing_min_distance(wires))
-    print(get_crossing_min_delay(wires))
+    return (
+        lambda: get_crossing_min_distance(wires),
+        lambda: get_crossing_min_delay(wires),
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,6 +1,6 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import collections
+import benchmark
 
 
 def is_valid(n):
@@ -37,15 +37,18 @@ def run_tests():
     assert is_valid2(111122)
 
 
-def get_solutions():
+def get_parts():
     input_range = 172930, 683082
-    print(len(list(get_passwords(input_range, is_valid))))
-    print(len(list(get_passwords(input_range, is_valid2))))
+    return (
+        lambda: len(list(get_passwords(input_range, is_valid))),
+        lambda: len(list(get_passwords(input_range, is_valid2))),
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
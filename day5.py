@@ -1,21 +1,24 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import int_code
+import benchmark
 
 
 def run_tests():
     int_code.run_tests_day5()
 
 
-def get_solutions():
+def get_parts():
     intcode = int_code.get_intcode_from_file("day5_input.txt")
-    print(int_code.run_diagnostic(intcode, input_=1))
-    print(int_code.run_diagnostic(intcode, input_=5))
+    return (
+        lambda: int_code.run_diagnostic(intcode, input_=1),
+        lambda: int_code.run_diagnostic(intcode, input_=5),
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
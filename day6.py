@@ -1,10 +1,10 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
+import benchmark
+import input_files
 
 
 def get_orbits_from_file(file_path="day6_input.txt"):
-    with open(file_path) as f:
-        return [l.strip() for l in f]
+    return list(input_files.iter_lines(file_path))
 
 
 def build_graph(orbits):
@@ -69,16 +69,16 @@ def run_tests():
     assert distance_to_santa(graph) == 4
 
 
-def get_solutions():
+def get_parts():
     orbits = get_orbits_from_file()
     graph = build_graph(orbits)
-    print(count_distance(graph))
-    print(distance_to_santa(graph))
+    return lambda: count_distance(graph), lambda: distance_to_santa(graph)
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
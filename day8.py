@@ -1,11 +1,12 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import itertools
+import benchmark
+import input_files
 
 
 def get_image_from_file(file_path="day8_input.txt"):
-    with open(file_path) as f:
-        return [l.strip() for l in f][0]
+    # Single line decoded straight from the mapped file
+    return str(input_files.get_line_view(file_path), "ascii")
 
 
 def grouper(iterable, n, fillvalue=None):
@@ -47,16 +48,19 @@ def run_tests():
 10"""
 
 
-def get_solutions():
+def get_parts():
     image = get_image_from_file()
     width, height = 25, 6
-    print(find_number1(image, width, height))
-    print(get_image(image, width, height).replace("0", " "))
+    return (
+        lambda: find_number1(image, width, height),
+        lambda: get_image(image, width, height).replace("0", " "),
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
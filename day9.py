@@ -1,21 +1,26 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
 import int_code
+import int_code_compiler
+import benchmark
 
 
 def run_tests():
     int_code.run_tests_day9()
 
 
-def get_solutions():
+def get_parts():
     intcode = int_code.get_intcode_from_file("day9_input.txt")
-    print(int_code.run(intcode, input_=1)[1])
-    print(int_code.run(intcode, input_=2)[1])
+    program = int_code_compiler.compile_program(intcode)
+    return (
+        lambda: program.run(input_=1, with_final_intcode=False)[1],
+        lambda: program.run(input_=2, with_final_intcode=False)[1],
+    )
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -1,23 +1,25 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
-import datetime
+import benchmark
+import input_files
 
 
 def get_xxx_from_file(file_path="dayDAYNUMBER_input.txt"):
-    with open(file_path) as f:
-        return [l.strip() for l in f]
+    return list(input_files.iter_lines(file_path))
 
 
 def run_tests():
     xxx = some_hardcoded_value
 
 
-def get_solutions():
+def get_parts():
     xxx = get_xxx_from_file()
+    return ()
+
+
+def get_solutions():
+    for part in get_parts():
+        print(part())
 
 
 if __name__ == "__main__":
-    begin = datetime.datetime.now()
-    run_tests()
-    get_solutions()
-    end = datetime.datetime.now()
-    print(end - begin)
+    benchmark.main(run_tests, get_parts)
@@ -0,0 +1,100 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import mmap
+import os
+import tempfile
+
+directory = os.path.dirname(os.path.abspath(__file__))
+
+
+def get_path(file_path):
+    """Return path of an input file: relative paths are looked for in the
+    directory of the modules first, so that days run from any working
+    directory."""
+    path = os.path.join(directory, file_path)
+    return path if os.path.exists(path) else file_path
+
+
+def iter_lines(file_path, strip=True):
+    """Yield lines of a text file, stripped or with their end of line,
+    read through mmap: the file is never read as a whole."""
+    with open(get_path(file_path), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return  # Empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for line in iter(data.readline, b""):
+                line = line.decode()
+                yield line.strip() if strip else line
+
+
+def get_line_view(file_path):
+    """Return first line of a file (without its end of line) as a memoryview
+    on the mapped file: nothing is copied. The mapping is released once the
+    view and its slices are."""
+    with open(get_path(file_path), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b"")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    end = data.find(b"\n")
+    end = len(data) if end < 0 else end
+    if end and data[end - 1] == ord("\r"):
+        end -= 1
+    return memoryview(data)[:end]
+
+
+def iter_chunks(file_path, chunk_size=1 << 16):
+    """Yield content of a file as bytes chunks: memory use does not depend
+    on the size of the file."""
+    with open(get_path(file_path), "rb") as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+
+def iter_fields(file_path, sep=b",", chunk_size=1 << 16):
+    """Yield bytes between separators (surrounding whitespace included),
+    read in chunks: fields can be split across chunks."""
+    rest = b""
+    for chunk in iter_chunks(file_path, chunk_size):
+        fields = (rest + chunk).split(sep)
+        rest = fields.pop()
+        yield from fields
+    if rest.strip():
+        yield rest
+
+
+def run_tests():
+    assert get_path("day8_input.txt") == os.path.join(directory, "day8_input.txt")
+    assert get_path("/no/such/file") == "/no/such/file"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "input.txt")
+        with open(path, "wb") as f:
+            f.write(b" ab \r\ncd\n\nlast")
+        assert list(iter_lines(path)) == ["ab", "cd", "", "last"]
+        assert list(iter_lines(path, strip=False)) == [" ab \r\n", "cd\n", "\n", "last"]
+        view = get_line_view(path)
+        assert isinstance(view, memoryview) and view == b" ab "
+        assert view[1:3] == b"ab"
+        assert b"".join(iter_chunks(path, chunk_size=3)) == b" ab \r\ncd\n\nlast"
+        with open(path, "wb") as f:
+            f.write(b"1,-22,333,4\n")
+        for chunk_size in (1, 2, 3, 100):
+            fields = list(iter_fields(path, chunk_size=chunk_size))
+            assert [int(v) for v in fields] == [1, -22, 333, 4]
+        with open(path, "wb") as f:
+            pass
+        assert list(iter_lines(path)) == []
+        assert get_line_view(path) == b""
+        assert list(iter_fields(path)) == []
+    # Current directory does not matter
+    cwd = os.getcwd()
+    try:
+        os.chdir(tempfile.gettempdir())
+        assert len(get_line_view("day8_input.txt")) == 15000
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -1,6 +1,14 @@
 # vi: set shiftwidth=4 tabstop=4 expandtab:
 import datetime
+import array
 import collections
+import functools
+import hashlib
+import itertools
+import queue
+import threading
+import time
+import input_files
 
 
 def get_intcode_from_string(s):
@@ -8,9 +16,221 @@ def get_intcode_from_string(s):
 
 
 def get_intcode_from_file(file_path):
-    with open(file_path) as f:
-        for l in f:
-            return get_intcode_from_string(l)
+    return [int(v) for v in input_files.iter_fields(file_path, b",")]
+
+
+class Memory:
+    """Intcode memory: a list for the program and the addresses close to it,
+    a dict for the distant ones.
+
+    Reading or writing past the end of the list extends it (list.extend is
+    amortised, the underlying storage grows geometrically). Addresses more
+    than sparse_gap cells past the end go to the dict instead. As with the
+    original defaultdict, every address accessed is part of the final image.
+    Negative addresses go to the dict too, but are left out of the image."""
+
+    def __init__(self, intcode, sparse_gap=4096):
+        self.cells = list(intcode)
+        self.far = dict()
+        self.sparse_gap = sparse_gap
+
+    def __getitem__(self, addr):
+        cells = self.cells
+        if 0 <= addr < len(cells):
+            return cells[addr]
+        return self.far.setdefault(addr, 0) if self.is_far(addr) else self.grow(addr)
+
+    def __setitem__(self, addr, value):
+        cells = self.cells
+        if 0 <= addr < len(cells):
+            cells[addr] = value
+        elif self.is_far(addr):
+            self.far[addr] = value
+        else:
+            self.grow(addr)
+            cells[addr] = value
+
+    def is_far(self, addr):
+        return addr < 0 or addr >= len(self.cells) + self.sparse_gap
+
+    def grow(self, addr):
+        cells, far = self.cells, self.far
+        cells.extend([0] * (addr + 1 - len(cells)))
+        for a in [a for a in far if 0 <= a <= addr]:
+            cells[a] = far.pop(a)
+        return cells[addr]
+
+    def nb_cells(self):
+        """Return number of cells stored."""
+        return len(self.cells) + len(self.far)
+
+    def reader(self, engine, mode, val):
+        """Return function reading an operand for engine."""
+        cells = self.cells
+        if mode == 0:  # Position mode
+            if val < 0:
+                return lambda: self[val]
+            return lambda: cells[val] if val < len(cells) else self[val]
+        elif mode == 1:  # Immediate mode
+            return lambda: val
+        elif mode == 2:  # Relative mode
+
+            def read():
+                addr = val + engine.relative_base
+                return cells[addr] if 0 <= addr < len(cells) else self[addr]
+
+            return read
+        else:
+            assert False
+
+    def writer(self, engine, mode, val):
+        """Return function writing a value for engine."""
+        cells = self.cells
+        code_cells = engine.code_cells
+        relative = mode == 2  # Relative mode
+        assert mode in (0, 2)  # or Position mode
+
+        def write(value):
+            addr = val + engine.relative_base if relative else val
+            if 0 <= addr < len(cells):
+                cells[addr] = value
+            else:
+                self[addr] = value
+            if addr in code_cells:
+                engine.invalidate(addr)
+
+        return write
+
+    def to_list(self):
+        cells, far = self.cells, self.far
+        final = list(cells)
+        if far:
+            final.extend([0] * max(0, max(far) + 1 - len(cells)))
+            for a, v in far.items():
+                if a >= 0:
+                    final[a] = v
+        return final
+
+
+INT64_MIN, INT64_MAX = -(2**63), 2**63 - 1
+
+
+class Int64Memory(Memory):
+    """Memory storing values as signed 64-bit integers (array "q").
+
+    Storing a value that does not fit raises OverflowError: the engine
+    then switches to a plain Memory (see DecodedEngine.promote_memory)."""
+
+    def __init__(self, intcode, sparse_gap=4096):
+        super().__init__((), sparse_gap)
+        self.cells = array.array("q", intcode)
+
+    def __setitem__(self, addr, value):
+        if not INT64_MIN <= value <= INT64_MAX:
+            raise OverflowError(value)
+        super().__setitem__(addr, value)
+
+    def writer(self, engine, mode, val):
+        write = super().writer(engine, mode, val)
+
+        def checked_write(value):
+            try:
+                write(value)
+            except OverflowError:
+                engine.promote_memory()
+                engine.writer(mode, val)(value)
+
+        return checked_write
+
+
+PAGE_BITS = 8
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+
+class PagedMemory:
+    """Copy-on-write Intcode memory made of fixed-size pages.
+
+    A fork shares all the pages with the original memory: a page is only
+    copied by the first of them to write into it. Negative addresses are
+    kept in a dict, as with Memory."""
+
+    def __init__(self, intcode=()):
+        self.pages = dict()
+        self.owned = set()
+        self.negative = dict()
+        self.size = 0
+        for n, start in enumerate(range(0, len(intcode), PAGE_SIZE)):
+            page = list(intcode[start : start + PAGE_SIZE])
+            page.extend([0] * (PAGE_SIZE - len(page)))
+            self.pages[n] = page
+            self.owned.add(n)
+        self.size = len(intcode)
+
+    def __getitem__(self, addr):
+        if addr < 0:
+            return self.negative.setdefault(addr, 0)
+        if addr >= self.size:
+            self.size = addr + 1
+        page = self.pages.get(addr >> PAGE_BITS)
+        return 0 if page is None else page[addr & PAGE_MASK]
+
+    def __setitem__(self, addr, value):
+        if addr < 0:
+            self.negative[addr] = value
+            return
+        if addr >= self.size:
+            self.size = addr + 1
+        n = addr >> PAGE_BITS
+        if n in self.owned:
+            page = self.pages[n]
+        else:
+            page = self.pages.get(n)
+            page = [0] * PAGE_SIZE if page is None else list(page)
+            self.pages[n] = page
+            self.owned.add(n)
+        page[addr & PAGE_MASK] = value
+
+    def fork(self):
+        other = PagedMemory()
+        other.pages = dict(self.pages)
+        other.negative = dict(self.negative)
+        other.size = self.size
+        self.owned = set()
+        return other
+
+    def nb_cells(self):
+        """Return number of cells stored (shared pages included)."""
+        return len(self.pages) * PAGE_SIZE + len(self.negative)
+
+    def reader(self, engine, mode, val):
+        """Return function reading an operand for engine."""
+        if mode == 0:  # Position mode
+            return lambda: self[val]
+        elif mode == 1:  # Immediate mode
+            return lambda: val
+        elif mode == 2:  # Relative mode
+            return lambda: self[val + engine.relative_base]
+        else:
+            assert False
+
+    def writer(self, engine, mode, val):
+        """Return function writing a value for engine."""
+        write = engine.write
+        if mode == 0:  # Position mode
+            return lambda value: write(val, value)
+        elif mode == 2:  # Relative mode
+            return lambda value: write(val + engine.relative_base, value)
+        else:
+            assert False
+
+    def to_list(self):
+        final = [0] * self.size
+        for n, page in self.pages.items():
+            start = n << PAGE_BITS
+            if start < self.size:
+                final[start : start + PAGE_SIZE] = page[: self.size - start]
+        return final
 
 
 def parse_op_code(op):
@@ -34,6 +254,7 @@ def get_value(intcode, pos, mode, relative_base):
     else:
         assert False
 
+
 def set_value(intcode, pos, mode, relative_base, value):
     val = intcode[pos]
     if mode == 0:  # Position mode
@@ -51,14 +272,18 @@ def get_values_from_pos(intcode, pos, modes, relative_base):
     ]
 
 
-def run(intcode, input_=None):
-    intcode = collections.defaultdict(int, enumerate(intcode))
+def run(intcode, input_=None, with_final_intcode=True, max_instructions=None):
+    intcode = Memory(intcode)
     output = []
     pos, relative_base = 0, 0
-    while True:
+    if max_instructions is None:
+        steps = itertools.repeat(None)
+    else:
+        steps = range(max_instructions)
+    for _ in steps:
         op, mode1, mode2, mode3 = parse_op_code(intcode[pos])
         if op == 99:
-            final_intcode = [intcode[v] for v in range(max(intcode) + 1)]
+            final_intcode = intcode.to_list() if with_final_intcode else None
             return final_intcode, output
         elif op == 1:  # Addition
             a, b = get_values_from_pos(intcode, pos, [mode1, mode2], relative_base)
@@ -96,6 +321,500 @@ def run(intcode, input_=None):
             pos += 2
         else:
             assert False
+    raise BudgetExceeded("instruction limit", pos, relative_base, max_instructions)
+
+
+# Number of parameters for each op code
+nb_params = {1: 3, 2: 3, 3: 1, 4: 1, 5: 2, 6: 2, 7: 3, 8: 3, 9: 1, 99: 0}
+
+# Short names for op codes and addressing modes
+mnemonics = {
+    1: "add",
+    2: "mul",
+    3: "in",
+    4: "out",
+    5: "jnz",
+    6: "jz",
+    7: "lt",
+    8: "eq",
+    9: "arb",
+    99: "hlt",
+}
+mode_names = {0: "position", 1: "immediate", 2: "relative"}
+
+# Kind of decoded instructions: most of them are handled directly
+# in the dispatch loop, the others need help from the caller
+NORMAL, INPUT, OUTPUT, HALT = range(4)
+
+
+class DecodedEngine:
+    """Intcode engine decoding each instruction only once.
+
+    Decoded instructions are cached as (kind, handler) by position. The
+    cache entries are dropped when a write lands on a decoded cell."""
+
+    def __init__(self, intcode, paged=False, int64=False):
+        if paged:
+            self.memory = PagedMemory(intcode)
+        elif int64:
+            try:
+                self.memory = Int64Memory(intcode)
+            except OverflowError:
+                self.memory = Memory(intcode)
+        else:
+            self.memory = Memory(intcode)
+        self.relative_base = 0
+        self.decoded = dict()
+        # Positions of the decoded instructions covering each cell: a set,
+        # re-decoding after an invalidation does not add the position twice
+        self.code_cells = collections.defaultdict(set)
+
+    def promote_memory(self):
+        """Move from Int64Memory to arbitrary-precision Memory."""
+        old = self.memory
+        self.memory = Memory(old.cells.tolist(), old.sparse_gap)
+        self.memory.far = old.far
+        self.decoded.clear()
+        self.code_cells.clear()
+
+    def write(self, addr, value):
+        self.memory[addr] = value
+        if addr in self.code_cells:
+            self.invalidate(addr)
+
+    def invalidate(self, addr):
+        for pos in self.code_cells.pop(addr):
+            self.decoded.pop(pos, None)
+
+    def reader(self, mode, val):
+        return self.memory.reader(self, mode, val)
+
+    def writer(self, mode, val):
+        return self.memory.writer(self, mode, val)
+
+    def decode(self, pos):
+        op, mode1, mode2, mode3 = parse_op_code(self.memory[pos])
+        assert op in nb_params, op  # As in run
+        nb = nb_params[op]
+        params = [self.memory[pos + i] for i in range(1, nb + 1)]
+        kind, handler = instruction_makers[op](
+            self, pos + nb + 1, [mode1, mode2, mode3], params
+        )
+        for i in range(nb + 1):
+            self.code_cells[pos + i].add(pos)
+        self.decoded[pos] = kind, handler
+        return kind, handler
+
+    def final_intcode(self):
+        return self.memory.to_list()
+
+
+def make_arithmetic(func):
+    def maker(engine, next_pos, modes, params):
+        a, b = (engine.reader(m, p) for m, p in zip(modes[:2], params[:2]))
+        c = engine.writer(modes[2], params[2])
+
+        def handler():
+            c(func(a(), b()))
+            return next_pos
+
+        return NORMAL, handler
+
+    return maker
+
+
+def make_jump(jump_if):
+    def maker(engine, next_pos, modes, params):
+        a, b = (engine.reader(m, p) for m, p in zip(modes[:2], params[:2]))
+        if modes[1] == 1:  # Immediate mode
+            target = params[1]
+
+            def handler():
+                return target if bool(a()) == jump_if else next_pos
+
+        else:
+            # Target read even when not jumping, as in run: reading
+            # extends memory (or fails)
+            def handler():
+                cond, target = a(), b()
+                return target if bool(cond) == jump_if else next_pos
+
+        return NORMAL, handler
+
+    return maker
+
+
+def make_input(engine, next_pos, modes, params):
+    a = engine.writer(modes[0], params[0])
+
+    def handler(value):
+        a(value)
+        return next_pos
+
+    return INPUT, handler
+
+
+def make_output(engine, next_pos, modes, params):
+    return OUTPUT, engine.reader(modes[0], params[0])
+
+
+def make_relative_base(engine, next_pos, modes, params):
+    a = engine.reader(modes[0], params[0])
+
+    def handler():
+        engine.relative_base += a()
+        return next_pos
+
+    return NORMAL, handler
+
+
+def make_halt(engine, next_pos, modes, params):
+    return HALT, None
+
+
+instruction_makers = {
+    1: make_arithmetic(lambda a, b: a + b),  # Addition
+    2: make_arithmetic(lambda a, b: a * b),  # Multiplication
+    3: make_input,  # Save-input
+    4: make_output,  # Output
+    5: make_jump(True),  # Jump-if-true
+    6: make_jump(False),  # Jump-if-false
+    7: make_arithmetic(lambda a, b: 1 if a < b else 0),  # Less-then
+    8: make_arithmetic(lambda a, b: 1 if a == b else 0),  # Equals
+    9: make_relative_base,  # Relative base
+    99: make_halt,
+}
+
+
+Snapshot = collections.namedtuple("Snapshot", "memory pos relative_base state")
+
+# States of a machine
+RUNNING, WAITING, HALTED, STOPPED = "running", "waiting", "halted", "stopped"
+
+
+class IntcodeMachine(DecodedEngine):
+    """Resumable Intcode machine.
+
+    Inputs come from iterables or queues given to feed. Iterating over the
+    machine runs it and yields outputs as soon as they are produced. When
+    no input is available, the iteration stops in the WAITING state: feed
+    more input and iterate again to resume."""
+
+    def __init__(self, intcode, inputs=(), paged=False, int64=False):
+        super().__init__(intcode, paged, int64)
+        self.pos = 0
+        self.state = RUNNING
+        self.input_sources = collections.deque()
+        self.feed(inputs)
+
+    def snapshot(self):
+        """Return frozen copy of the machine state, inputs excluded.
+
+        Memory is converted to paged memory the first time so that the
+        snapshot and the machine share pages instead of copying them."""
+        if not isinstance(self.memory, PagedMemory):
+            memory = PagedMemory(self.memory.to_list())
+            for addr, value in self.memory.far.items():
+                if addr < 0:
+                    memory[addr] = value
+            self.memory = memory
+            self.decoded.clear()
+            self.code_cells.clear()
+        return Snapshot(self.memory.fork(), self.pos, self.relative_base, self.state)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, inputs=()):
+        machine = cls((), inputs)
+        machine.memory = snapshot.memory.fork()
+        machine.pos = snapshot.pos
+        machine.relative_base = snapshot.relative_base
+        machine.state = snapshot.state
+        return machine
+
+    def fork(self, inputs=()):
+        """Return independent copy of the machine, sharing memory pages.
+
+        The copy has the type of the machine: subclasses extend fork to
+        copy their own state."""
+        return self.from_snapshot(self.snapshot(), inputs)
+
+    def feed(self, inputs):
+        """Add an input source: any iterable, or a queue.Queue-like object."""
+        if hasattr(inputs, "get_nowait"):
+            self.input_sources.append(inputs)
+        else:
+            self.input_sources.append(iter(inputs))
+
+    def get_input(self):
+        """Return next input value, None if no input is available."""
+        sources = self.input_sources
+        while sources:
+            source = sources[0]
+            if hasattr(source, "get_nowait"):
+                try:
+                    return source.get_nowait()
+                except queue.Empty:
+                    return None
+            for value in source:
+                return value
+            sources.popleft()
+        return None
+
+    def __iter__(self):
+        decoded = self.decoded
+        pos = self.pos
+        self.state = RUNNING
+        while True:
+            try:
+                kind, handler = decoded[pos]
+            except KeyError:
+                kind, handler = self.decode(pos)
+            if kind == NORMAL:
+                pos = handler()
+            elif kind == OUTPUT:
+                value = handler()
+                self.pos = pos + 2
+                yield value
+                pos = self.pos
+            elif kind == INPUT:
+                value = self.get_input()
+                if value is None:
+                    self.pos, self.state = pos, WAITING
+                    return
+                pos = handler(value)
+            else:
+                self.pos, self.state = pos, HALTED
+                return
+
+
+class CancellationToken:
+    """Flag that any thread or asyncio task can set to stop machines."""
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    def is_cancelled(self):
+        return self.event.is_set()
+
+
+class BudgetExceeded(Exception):
+    """Run stopped by its budget or cancellation token.
+
+    A machine (if any) is left in the STOPPED state at pos: it can be
+    inspected, snapshotted or resumed by iterating again (after raising
+    the limit)."""
+
+    def __init__(self, reason, pos, relative_base, nb_instructions, machine=None):
+        super().__init__(
+            "%s at pos %d after %d instructions" % (reason, pos, nb_instructions)
+        )
+        self.reason = reason
+        self.machine = machine
+        self.pos = pos
+        self.relative_base = relative_base
+        self.nb_instructions = nb_instructions
+
+
+class Budget:
+    """Limits on instructions, wall-clock seconds and memory cells,
+    checked every check_every instructions (None for no limit)."""
+
+    def __init__(
+        self,
+        max_instructions=None,
+        max_seconds=None,
+        max_cells=None,
+        token=None,
+        check_every=1000,
+    ):
+        self.max_instructions = max_instructions
+        self.max_seconds = max_seconds
+        self.max_cells = max_cells
+        self.token = token
+        self.check_every = check_every
+
+
+class BudgetedMachine(IntcodeMachine):
+    """IntcodeMachine enforcing a Budget.
+
+    Same dispatch loop as IntcodeMachine with an instruction counter; the
+    limits are only looked at every budget.check_every instructions (and
+    when starting). Machines without a budget keep the plain loop."""
+
+    def __init__(self, intcode, inputs=(), budget=None):
+        super().__init__(intcode, inputs)
+        self.budget = Budget() if budget is None else budget
+        self.nb_instructions = 0
+        self.deadline = None
+
+    def fork(self, inputs=()):
+        """Return copy with the same budget, instructions so far included."""
+        machine = super().fork(inputs)
+        machine.budget = self.budget
+        machine.nb_instructions = self.nb_instructions
+        machine.deadline = self.deadline
+        return machine
+
+    def check_budget(self):
+        budget = self.budget
+        if budget.token is not None and budget.token.is_cancelled():
+            reason = "cancelled"
+        elif (
+            budget.max_instructions is not None
+            and self.nb_instructions >= budget.max_instructions
+        ):
+            reason = "instruction limit"
+        elif self.deadline is not None and time.monotonic() > self.deadline:
+            reason = "time limit"
+        elif budget.max_cells is not None and self.memory.nb_cells() > budget.max_cells:
+            reason = "memory limit"
+        else:
+            return
+        self.state = STOPPED
+        raise BudgetExceeded(
+            reason, self.pos, self.relative_base, self.nb_instructions, self
+        )
+
+    def next_chunk(self):
+        budget = self.budget
+        if budget.max_instructions is None:
+            return budget.check_every
+        return min(budget.check_every, budget.max_instructions - self.nb_instructions)
+
+    def __iter__(self):
+        budget = self.budget
+        if self.deadline is None and budget.max_seconds is not None:
+            self.deadline = time.monotonic() + budget.max_seconds
+        decoded = self.decoded
+        pos = self.pos
+        self.state = RUNNING
+        self.check_budget()
+        # Instructions in the current chunk, and left before the next check
+        every = left = self.next_chunk()
+        while True:
+            if not left:
+                self.nb_instructions += every
+                self.pos = pos
+                self.check_budget()
+                every = left = self.next_chunk()
+            left -= 1
+            try:
+                kind, handler = decoded[pos]
+            except KeyError:
+                kind, handler = self.decode(pos)
+            if kind == NORMAL:
+                pos = handler()
+            elif kind == OUTPUT:
+                value = handler()
+                self.pos = pos + 2
+                self.nb_instructions += every - left
+                every = left
+                yield value
+                pos = self.pos
+            elif kind == INPUT:
+                value = self.get_input()
+                if value is None:
+                    self.nb_instructions += every - left - 1
+                    self.pos, self.state = pos, WAITING
+                    return
+                pos = handler(value)
+            else:
+                self.nb_instructions += every - left
+                self.pos, self.state = pos, HALTED
+                return
+
+
+def get_inputs(input_):
+    """Return inputs of the run functions: input_ forever (None for none)."""
+    return () if input_ is None else itertools.repeat(input_)
+
+
+def run_machine(machine, with_final_intcode=True, output=()):
+    """Run machine until it halts, return final image (None if not wanted)
+    and outputs, after the ones given (produced earlier)."""
+    output = list(output)
+    if machine.state != HALTED:
+        output.extend(machine)
+    assert machine.state == HALTED
+    final_intcode = machine.final_intcode() if with_final_intcode else None
+    return final_intcode, output
+
+
+def run_with_budget(intcode, input_=None, budget=None, with_final_intcode=True):
+    """Same as run_decoded, raising BudgetExceeded when going over budget."""
+    machine = BudgetedMachine(intcode, get_inputs(input_), budget)
+    return run_machine(machine, with_final_intcode)
+
+
+def run_decoded(intcode, input_=None, with_final_intcode=True, int64=False):
+    """Same as run but with instructions decoded once and table-dispatched,
+    with memory in 64-bit integers while values fit if int64 is set."""
+    machine = IntcodeMachine(intcode, get_inputs(input_), int64=int64)
+    return run_machine(machine, with_final_intcode)
+
+
+def get_program_key(intcode):
+    return hashlib.sha256(",".join(map(str, intcode)).encode()).digest()
+
+
+class PrefixCache:
+    """Machine states reached just before the first input is read.
+
+    Everything a program does before reading its first input is the same
+    for every run: it is done once per program, then later runs start from
+    the state saved (memory, position, relative base and the outputs
+    already produced). At most maxsize programs are kept, the least
+    recently used one is dropped first."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.prefixes = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def get_prefix(self, intcode):
+        key = get_program_key(intcode)
+        prefix = self.prefixes.get(key)
+        if prefix is not None:
+            self.hits += 1
+            self.prefixes.move_to_end(key)
+            return prefix
+        self.misses += 1
+        machine = IntcodeMachine(intcode)
+        output = tuple(machine)
+        memory = machine.memory
+        prefix = (
+            Snapshot(
+                tuple(memory.cells), machine.pos, machine.relative_base, machine.state
+            ),
+            dict(memory.far),
+            output,
+        )
+        self.prefixes[key] = prefix
+        if len(self.prefixes) > self.maxsize:
+            self.prefixes.popitem(last=False)
+        return prefix
+
+    def get_machine(self, intcode, inputs=()):
+        """Return machine at the first input read, with the outputs so far."""
+        snapshot, far, output = self.get_prefix(intcode)
+        machine = IntcodeMachine(snapshot.memory, inputs)
+        machine.memory.far.update(far)
+        machine.pos = snapshot.pos
+        machine.relative_base = snapshot.relative_base
+        machine.state = snapshot.state
+        return machine, list(output)
+
+
+prefix_cache = PrefixCache()
+
+
+def run_cached(intcode, input_=None, with_final_intcode=True):
+    """Same as run_decoded, starting from the cached prefix of the program."""
+    machine, output = prefix_cache.get_machine(intcode, get_inputs(input_))
+    return run_machine(machine, with_final_intcode, output)
 
 
 def run_verb_noun(intcode, noun, verb):
@@ -107,15 +826,26 @@ def run_verb_noun(intcode, noun, verb):
     return intcode[0]
 
 
+def run_verb_noun_from_snapshot(snapshot, noun, verb):
+    """Same as run_verb_noun, starting from a snapshot of the program."""
+    machine = IntcodeMachine.from_snapshot(snapshot)
+    machine.write(1, noun)
+    machine.write(2, verb)
+    assert list(machine) == []
+    return machine.memory[0]
+
+
 def run_diagnostic(intcode, input_):
     """Specific to day 5 ?."""
-    _, output = run(intcode, input_)
-    diag = [v for v in output if v != 0]
-    assert len(diag) == 1
-    return diag[0]
+    # Stop as soon as a test fails or the diagnostic code is given
+    machine, output = prefix_cache.get_machine(intcode, itertools.repeat(input_))
+    for v in itertools.chain(output, machine if machine.state != HALTED else ()):
+        if v != 0:
+            return v
+    assert False
 
 
-def run_tests_day2():
+def run_tests_day2(run=run):
     intcode = get_intcode_from_string("1,9,10,3,2,3,11,0,99,30,40,50")
     assert run(intcode) == ([3500, 9, 10, 70, 2, 3, 11, 0, 99, 30, 40, 50], [])
     assert run_verb_noun(intcode, 9, 10) == 3500
@@ -130,7 +860,7 @@ def run_tests_day2():
     assert run(intcode) == ([30, 1, 1, 4, 2, 5, 6, 0, 99], [])
 
 
-def run_tests_day5():
+def run_tests_day5(run=run):
     intcode = get_intcode_from_string("1002,4,3,4,33")
     assert run(intcode) == ([1002, 4, 3, 4, 99], [])
     intcode = get_intcode_from_string("1101,100,-1,4,0")
@@ -167,7 +897,7 @@ def run_tests_day5():
     assert run(intcode, 9)[1] == [1001]
 
 
-def run_tests_day9():
+def run_tests_day9(run=run):
     intcode = get_intcode_from_string(
         "109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99"
     )
@@ -195,12 +925,251 @@ def run_tests_day9():
     intcode = get_intcode_from_string("109,1,203,2,204,2,99")
     assert run(intcode, 42)[1] == [42]
     assert run(intcode, 314)[1] == [314]
+    # Negative addresses: read as 0, not part of the final image
+    intcode = get_intcode_from_string("1,-1,0,5,99,0")
+    assert run(intcode) == ([1, -1, 0, 5, 99, 1], [])
+    intcode = get_intcode_from_string("1101,7,0,-3,4,-3,99")
+    assert run(intcode) == ([1101, 7, 0, -3, 4, -3, 99], [7])
+    # Far away addresses
+    intcode = get_intcode_from_string("1101,3,4,100000,4,100000,99")
+    final, output = run(intcode)
+    assert output == [7]
+    assert len(final) == 100001 and final[100000] == 7
+    assert run(intcode, with_final_intcode=False) == (None, [7])
+    # Jump target read even when the jump is not taken
+    intcode = get_intcode_from_string("6,0,1000,99")
+    assert len(run(intcode)[0]) == 1001
+
+
+def run_engine_tests(run=run):
+    """Tests for functions behaving as run."""
+    run_tests_day2(run)
+    run_tests_day5(run)
+    run_tests_day9(run)
+    run_tests_self_modifying(run)
+
+
+def run_tests_self_modifying(run=run):
+    # Instruction at 4 goes from addition to multiplication between 2 runs
+    intcode = get_intcode_from_string(
+        "1101,0,3,100,1,100,100,100,1101,0,2,4,1005,101,22,1101,0,1,101,1105,1,4,4,100,99"
+    )
+    assert run(intcode)[1] == [36]
+
+
+def run_tests_code_cells():
+    # Loop rewriting an operand of its first instruction at each iteration
+    intcode = get_intcode_from_string(
+        "1001,30,1,30,1001,1,0,1,1007,30,2000,31,1005,31,0,99"
+    )
+    intcode.extend([0] * 16)
+    machine = IntcodeMachine(intcode)
+    assert list(machine) == [] and machine.memory[30] == 2000
+    assert max(len(positions) for positions in machine.code_cells.values()) == 1
+
+
+def run_tests_machine():
+    intcode = get_intcode_from_string("3,9,8,9,10,9,4,9,99,-1,8")
+    machine = IntcodeMachine(intcode)
+    assert list(machine) == []
+    assert machine.state == WAITING
+    machine.feed([8])
+    assert list(machine) == [1]
+    assert machine.state == HALTED
+    # Inputs from a queue, echoed until a 0 is read
+    intcode = get_intcode_from_string("3,11,4,11,1005,11,0,99")
+    q = queue.Queue()
+    machine = IntcodeMachine(intcode, q)
+    outputs = iter(machine)
+    q.put(3)
+    assert next(outputs) == 3
+    q.put(2)
+    assert next(outputs) == 2
+    assert list(outputs) == []
+    assert machine.state == WAITING
+    q.put(0)
+    assert list(machine) == [0]
+    assert machine.state == HALTED
+    # Outputs are produced one at a time
+    intcode = get_intcode_from_string(
+        "109,1,204,-1,1001,100,1,100,1008,100,16,101,1006,101,0,99"
+    )
+    assert list(itertools.islice(IntcodeMachine(intcode), 3)) == [109, 1, 204]
+
+
+def run_tests_snapshot():
+    intcode = get_intcode_from_string("1,9,10,3,2,3,11,0,99,30,40,50")
+    snapshot = IntcodeMachine(intcode, paged=True).snapshot()
+    assert run_verb_noun_from_snapshot(snapshot, 9, 10) == 3500
+    assert run_verb_noun_from_snapshot(snapshot, 0, 0) == run_verb_noun(intcode, 0, 0)
+    assert snapshot.memory.to_list() == intcode
+    # Forks share the state reached so far
+    intcode = get_intcode_from_string("3,11,4,11,1005,11,0,99")
+    machine = IntcodeMachine(intcode, [5])
+    assert next(iter(machine)) == 5
+    fork1 = machine.fork([0])
+    fork2 = machine.fork([7, 0])
+    assert list(machine) == []
+    assert machine.state == WAITING
+    assert list(fork1) == [0]
+    assert fork1.state == HALTED
+    assert list(fork2) == [7, 0]
+    assert fork2.final_intcode() == intcode + [0] * 4
+    machine.feed([0])
+    assert list(machine) == [0]
+    # Only written pages are copied
+    intcode = [0] * (PAGE_SIZE * 4)
+    intcode[:5] = [1101, 1, 2, 1000, 99]
+    machine = IntcodeMachine(intcode, paged=True)
+    fork = machine.fork()
+    assert list(fork) == []
+    assert fork.memory[1000] == 3 and machine.memory[1000] == 0
+    shared = [n for n, p in fork.memory.pages.items() if p is machine.memory.pages[n]]
+    assert shared == [0, 1, 2]
+
+
+def run_tests_int64():
+    intcode = get_intcode_from_string("1102,34915192,34915192,7,4,7,99,0")
+    machine = IntcodeMachine(intcode, int64=True)
+    assert list(machine) == [1219070632396864]
+    assert isinstance(machine.memory, Int64Memory)
+    # Overflow on multiplication, input and far away cells
+    intcode = get_intcode_from_string("1102,4294967296,4294967296,7,4,7,99,0")
+    machine = IntcodeMachine(intcode, int64=True)
+    assert list(machine) == [2**64]
+    assert not isinstance(machine.memory, Int64Memory)
+    intcode = get_intcode_from_string("3,100000,4,100000,99")
+    run_int64 = functools.partial(run_decoded, int64=True)
+    assert run_int64(intcode, 2**70) == run(intcode, 2**70)
+    assert run_int64(intcode, -(2**63)) == run(intcode, -(2**63))
+    intcode = [104, 2**80, 99]
+    assert run_int64(intcode) == ([104, 2**80, 99], [2**80])
+
+
+def run_tests_budget():
+    # Infinite loop
+    intcode = get_intcode_from_string("1001,7,1,7,1105,1,0,0")
+    machine = BudgetedMachine(intcode, budget=Budget(max_instructions=1000))
+    try:
+        list(machine)
+        assert False
+    except BudgetExceeded as e:
+        assert e.reason == "instruction limit"
+        assert e.nb_instructions == 1000 and e.pos == 0
+        assert machine.state == STOPPED and machine.memory[7] == 500
+    machine.budget.max_instructions = 3000
+    try:
+        list(machine)
+        assert False
+    except BudgetExceeded as e:
+        assert e.nb_instructions == 3000 and machine.memory[7] == 1500
+    budget = Budget(max_seconds=0.01, check_every=100)
+    try:
+        run_with_budget(intcode, budget=budget)
+        assert False
+    except BudgetExceeded as e:
+        assert e.reason == "time limit"
+    # Growing memory forever
+    intcode = get_intcode_from_string("109,1000,21101,1,0,0,1105,1,0")
+    try:
+        run_with_budget(intcode, budget=Budget(max_cells=10**5))
+        assert False
+    except BudgetExceeded as e:
+        assert e.reason == "memory limit"
+    machine = BudgetedMachine(intcode, budget=Budget(max_cells=10**5))
+    machine.snapshot()  # Paged memory from now on
+    try:
+        list(machine)
+        assert False
+    except BudgetExceeded as e:
+        assert e.reason == "memory limit"
+    # Cancelled from another thread
+    intcode = get_intcode_from_string("1001,7,1,7,1105,1,0,0")
+    token = CancellationToken()
+    threading.Timer(0.01, token.cancel).start()
+    try:
+        run_with_budget(intcode, budget=Budget(token=token))
+        assert False
+    except BudgetExceeded as e:
+        assert e.reason == "cancelled"
+    # Counting instructions across inputs and outputs
+    intcode = get_intcode_from_string("3,11,4,11,1005,11,0,99")
+    machine = BudgetedMachine(intcode, [3, 2, 0], Budget(max_instructions=10))
+    assert list(machine) == [3, 2, 0]
+    assert machine.state == HALTED and machine.nb_instructions == 10
+    machine = BudgetedMachine(intcode, [3, 2, 1, 0], Budget(max_instructions=10))
+    output = []
+    try:
+        output.extend(machine)
+        assert False
+    except BudgetExceeded as e:
+        assert e.nb_instructions == 10 and e.pos == 2
+    assert output == [3, 2, 1]
+    try:
+        run(intcode, 1, max_instructions=10)
+        assert False
+    except BudgetExceeded as e:
+        assert e.nb_instructions == 10 and e.pos == 2 and e.machine is None
+    assert run(intcode, 0, max_instructions=4)[1] == [0]
+    machine.budget.max_instructions = None
+    assert list(machine) == [0] and machine.nb_instructions == 13
+    # Forks keep the budget and the instructions counted
+    intcode = get_intcode_from_string("1001,7,1,7,1105,1,0,0")
+    machine = BudgetedMachine(intcode, budget=Budget(max_instructions=1000))
+    try:
+        list(machine)
+        assert False
+    except BudgetExceeded:
+        pass
+    fork = machine.fork()
+    assert isinstance(fork, BudgetedMachine) and fork.nb_instructions == 1000
+    machine.budget.max_instructions = 2000
+    try:
+        list(fork)
+        assert False
+    except BudgetExceeded as e:
+        assert e.nb_instructions == 2000 and fork.memory[7] == 1000
+
+
+def run_tests_prefix_cache():
+    cache = PrefixCache(maxsize=2)
+    # Outputs 7, reads input, outputs it times 2
+    intcode = get_intcode_from_string("104,7,3,20,1002,20,2,20,4,20,99")
+    for input_ in (1, 2, 3):
+        machine, output = cache.get_machine(intcode, [input_])
+        assert output + list(machine) == [7, 2 * input_]
+        assert machine.final_intcode() == run(intcode, input_)[0]
+    assert (cache.hits, cache.misses) == (2, 1)
+    # Cached prefixes are not changed by the runs
+    machine, output = cache.get_machine(intcode, [5])
+    assert machine.memory[20] == 0 and output == [7]
+    # Least recently used program dropped
+    other = get_intcode_from_string("3,0,4,0,99")
+    halting = get_intcode_from_string("104,1,99")
+    cache.get_machine(other)
+    cache.get_machine(intcode)
+    cache.get_machine(halting)
+    assert len(cache.prefixes) == 2
+    assert get_program_key(other) not in cache.prefixes
+    assert get_program_key(intcode) in cache.prefixes
+    machine, output = cache.get_machine(halting)
+    assert machine.state == HALTED and output == [1]
+    # Far addresses
+    intcode = get_intcode_from_string("1101,3,4,100000,3,0,4,100000,99")
+    machine, output = cache.get_machine(intcode, [1])
+    assert list(machine) == [7] and machine.final_intcode() == run(intcode, 1)[0]
 
 
 def run_tests():
-    run_tests_day2()
-    run_tests_day5()
-    run_tests_day9()
+    run_int64 = functools.partial(run_decoded, int64=True)
+    for engine in (run, run_decoded, run_int64, run_with_budget, run_cached):
+        run_engine_tests(engine)
+    run_tests_code_cells()
+    run_tests_machine()
+    run_tests_snapshot()
+    run_tests_int64()
+    run_tests_budget()
+    run_tests_prefix_cache()
 
 
 if __name__ == "__main__":
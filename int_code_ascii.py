@@ -0,0 +1,107 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import codecs
+import io
+import int_code
+
+
+def to_input(data, encoding="ascii"):
+    """Return str or bytes as bytes: iterating over it gives the input
+    values directly, with no list of ints built."""
+    return data.encode(encoding) if isinstance(data, str) else bytes(data)
+
+
+class TextSink:
+    """Write callback for pump decoding bytes incrementally to a text stream:
+    characters split across chunks are handled."""
+
+    def __init__(self, stream, encoding="ascii"):
+        self.stream = stream
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+
+    def __call__(self, chunk):
+        self.stream.write(self.decoder.decode(chunk))
+
+    def close(self):
+        self.stream.write(self.decoder.decode(b"", final=True))
+
+
+def pump(machine, write, write_value=None, chunk_size=4096):
+    """Run machine, giving its outputs to write as chunks of bytes.
+
+    Outputs not fitting in a byte (the final answer of most ASCII programs)
+    are given to write_value after the bytes before them. Return the state
+    of the machine: feed it more input and pump again if it is WAITING."""
+    chunk = bytearray()
+    for value in machine:
+        if 0 <= value < 256:
+            chunk.append(value)
+            if len(chunk) >= chunk_size:
+                write(chunk)
+                chunk = bytearray()
+        else:
+            if chunk:
+                write(chunk)
+                chunk = bytearray()
+            assert write_value is not None, value
+            write_value(value)
+    if chunk:
+        write(chunk)
+    return machine.state
+
+
+def run_bytes(intcode, data=b""):
+    """Run program on str or bytes input, return output bytes and the
+    other output values."""
+    machine = int_code.IntcodeMachine(intcode, to_input(data))
+    output, values = bytearray(), []
+    pump(machine, output.extend, values.append)
+    return output, values
+
+
+def run_text(intcode, data=""):
+    """Same as run_bytes with output decoded as ASCII."""
+    machine = int_code.IntcodeMachine(intcode, to_input(data))
+    stream, values = io.StringIO(), []
+    sink = TextSink(stream)
+    pump(machine, sink, values.append)
+    sink.close()
+    return stream.getvalue(), values
+
+
+def run_tests():
+    intcode = int_code.get_intcode_from_string(
+        "104,72,104,105,104,10,104,1000000,104,33,99"
+    )
+    assert run_bytes(intcode) == (bytearray(b"Hi\n!"), [1000000])
+    assert run_text(intcode) == ("Hi\n!", [1000000])
+    # Echo: reading and writing one character at a time, waiting for input
+    echo = int_code.get_intcode_from_string("3,100,4,100,1105,1,0")
+    machine = int_code.IntcodeMachine(echo)
+    output = bytearray()
+    for data in ("abc\n", b"def", bytearray(b"\x00\xff")):
+        machine.feed(to_input(data))
+        assert pump(machine, output.extend) == int_code.WAITING
+    assert output == b"abc\ndef\x00\xff"
+    # UTF-8 characters split across chunks
+    machine = int_code.IntcodeMachine(echo, to_input("é€\n", "utf-8"))
+    stream = io.StringIO()
+    sink = TextSink(stream, "utf-8")
+    pump(machine, sink, chunk_size=1)
+    sink.close()
+    assert stream.getvalue() == "é€\n"
+    # Large output going through the callback only, in chunks
+    loop = int_code.get_intcode_from_string(
+        "104,97,1001,20,1,20,1007,20,100000,21,1005,21,0,99,0,0,0,0,0,0,0,0"
+    )
+    sizes = []
+    machine = int_code.IntcodeMachine(loop)
+    assert pump(machine, lambda chunk: sizes.append(len(chunk))) == int_code.HALTED
+    assert sum(sizes) == 100000 and max(sizes) == 4096
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -0,0 +1,258 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import itertools
+import numpy as np
+import int_code
+
+INT64_MIN = np.iinfo(np.int64).min
+
+
+class NegativeAddress(Exception):
+    """Raised before an instruction using a negative address has any effect."""
+
+
+class Batch:
+    """Copies of one Intcode program running in lockstep.
+
+    Memory is a 2-D int64 array with one row per instance. Instances at
+    the same position form a group executing each instruction together
+    with NumPy; a group splits when its instances jump to different
+    positions or find different op codes (self-modifying code). Each
+    instance has its own relative base.
+
+    An instance whose next addition or multiplication would not fit in
+    64 bits, or whose next instruction uses a negative address, leaves the
+    batch and is finished by an IntcodeMachine."""
+
+    def __init__(self, intcode, inputs, patches):
+        n = len(inputs)
+        self.mem = np.tile(np.array(intcode, dtype=np.int64), (n, 1))
+        for row, patch in enumerate(patches):
+            for addr, value in patch.items():
+                self.mem[row, addr] = value
+        self.inputs = inputs
+        self.input_values = np.array(
+            [0 if i is None else i for i in inputs], dtype=np.int64
+        )
+        self.has_input = np.array([i is not None for i in inputs])
+        self.relative_base = np.zeros(n, dtype=np.int64)
+        self.touched = np.full(n, len(intcode) - 1, dtype=np.int64)
+        self.outputs = [[] for _ in range(n)]
+        self.machines = dict()
+
+    def ensure(self, addr):
+        """Grow memory so that addr (scalar or array) can be used."""
+        top = int(np.max(addr))
+        if int(np.min(addr)) < 0:
+            raise NegativeAddress()
+        width = self.mem.shape[1]
+        if top >= width:
+            new_width = max(top + 1, 2 * width)
+            self.mem = np.pad(self.mem, ((0, 0), (0, new_width - width)))
+
+    def get(self, rows, addr):
+        self.ensure(addr)
+        self.touched[rows] = np.maximum(self.touched[rows], addr)
+        return self.mem[rows, addr]
+
+    def set(self, rows, addr, values):
+        self.ensure(addr)
+        self.touched[rows] = np.maximum(self.touched[rows], addr)
+        self.mem[rows, addr] = values
+
+    def address(self, rows, pos, mode):
+        param = self.get(rows, pos)
+        if mode == 0:  # Position mode
+            return param
+        elif mode == 2:  # Relative mode
+            return param + self.relative_base[rows]
+        else:
+            assert False
+
+    def read(self, rows, pos, mode):
+        if mode == 1:  # Immediate mode
+            return self.get(rows, pos)
+        return self.get(rows, self.address(rows, pos, mode))
+
+    def negative_rows(self, rows, pos):
+        """Return mask of the rows whose instruction at pos uses a negative
+        address."""
+        if pos < 0:
+            return np.ones(rows.size, dtype=bool)
+        op, *modes = int_code.parse_op_code(int(self.mem[rows[0], pos]))
+        negative = np.zeros(rows.size, dtype=bool)
+        for i, mode in enumerate(modes[: int_code.nb_params[op]], start=1):
+            if mode != 1:  # Not immediate mode
+                negative |= self.address(rows, pos + i, mode) < 0
+        return negative
+
+    def eject(self, rows, pos):
+        """Hand instances over to the arbitrary-precision interpreter."""
+        for row in rows.tolist():
+            intcode = self.mem[row, : self.touched[row] + 1].tolist()
+            inputs = (
+                () if self.inputs[row] is None else itertools.repeat(self.inputs[row])
+            )
+            machine = int_code.IntcodeMachine(intcode, inputs)
+            machine.pos = pos
+            machine.relative_base = int(self.relative_base[row])
+            self.machines[row] = machine
+
+    def run(self):
+        groups = [(0, np.arange(len(self.inputs)))]
+        while groups:
+            pos, rows = groups.pop()
+            while rows.size:
+                try:
+                    ops = self.get(rows, pos)
+                    if (ops != ops[0]).any():
+                        groups.extend((pos, rows[ops == op]) for op in np.unique(ops))
+                        break
+                    op, mode1, mode2, mode3 = int_code.parse_op_code(int(ops[0]))
+                    if op == 99:
+                        break
+                    elif op in (1, 2, 7, 8):
+                        a = self.read(rows, pos + 1, mode1)
+                        b = self.read(rows, pos + 2, mode2)
+                        if op == 1:  # Addition
+                            res = a + b
+                            over = ((a ^ res) & (b ^ res)) < 0
+                        elif op == 2:  # Multiplication
+                            res = a * b
+                            safe_a = np.where(a == 0, 1, a)
+                            over = (a != 0) & (res // safe_a != b)
+                            over |= (a == -1) & (b == INT64_MIN)
+                            over |= (b == -1) & (a == INT64_MIN)
+                        else:  # Less-then, Equals
+                            res = (a < b if op == 7 else a == b).astype(np.int64)
+                            over = None
+                        if over is not None and over.any():
+                            self.eject(rows[over], pos)
+                            rows, res = rows[~over], res[~over]
+                            if not rows.size:
+                                break
+                        self.set(rows, self.address(rows, pos + 3, mode3), res)
+                        pos += 4
+                    elif op == 3:  # Save-input
+                        assert self.has_input[rows].all()
+                        values = self.input_values[rows]
+                        self.set(rows, self.address(rows, pos + 1, mode1), values)
+                        pos += 2
+                    elif op == 4:  # Output
+                        values = self.read(rows, pos + 1, mode1)
+                        for row, v in zip(rows.tolist(), values.tolist()):
+                            self.outputs[row].append(v)
+                        pos += 2
+                    elif op in (5, 6):  # Jump-if-true, Jump-if-false
+                        a = self.read(rows, pos + 1, mode1)
+                        b = self.read(rows, pos + 2, mode2)
+                        jump = (a != 0) if op == 5 else (a == 0)
+                        new_pos = np.where(jump, b, pos + 3)
+                        if (new_pos != new_pos[0]).any():
+                            groups.extend(
+                                (int(p), rows[new_pos == p]) for p in np.unique(new_pos)
+                            )
+                            break
+                        pos = int(new_pos[0])
+                    elif op == 9:  # Relative base
+                        self.relative_base[rows] += self.read(rows, pos + 1, mode1)
+                        pos += 2
+                    else:
+                        assert False
+                except NegativeAddress:
+                    negative = self.negative_rows(rows, pos)
+                    self.eject(rows[negative], pos)
+                    rows = rows[~negative]
+        for row, machine in self.machines.items():
+            self.outputs[row].extend(machine)
+            assert machine.state == int_code.HALTED
+
+    def final_intcode(self, row):
+        if row in self.machines:
+            return self.machines[row].final_intcode()
+        return self.mem[row, : self.touched[row] + 1].tolist()
+
+
+def run_batch(intcode, inputs=None, patches=None, with_final_intcode=True):
+    """Run many copies of a program, the same as run for each of them.
+
+    Instance i uses inputs[i] for input (as input_ in run) and has its
+    memory patched with patches[i] ({address: value}) before starting.
+    Return the list of (final_intcode, output) for the instances."""
+    if inputs is None:
+        inputs = [None] * len(patches)
+    if patches is None:
+        patches = [dict()] * len(inputs)
+    assert len(inputs) == len(patches)
+    try:
+        batch = Batch(intcode, inputs, patches)
+    except OverflowError:
+        # Program, inputs or patches do not fit in 64 bits
+        return [
+            run_patched(intcode, input_, patch, with_final_intcode)
+            for input_, patch in zip(inputs, patches)
+        ]
+    batch.run()
+    return [
+        (batch.final_intcode(row) if with_final_intcode else None, output)
+        for row, output in enumerate(batch.outputs)
+    ]
+
+
+def run_single(intcode, input_=None, with_final_intcode=True):
+    """Same as int_code.run, as a batch of one instance."""
+    return run_batch(intcode, [input_], None, with_final_intcode)[0]
+
+
+def run_patched(intcode, input_, patch, with_final_intcode=True):
+    intcode = list(intcode)
+    for addr, value in patch.items():
+        intcode[addr] = value
+    return int_code.run(intcode, input_, with_final_intcode)
+
+
+def run_tests():
+    int_code.run_engine_tests(run_single)
+    # Instances taking different paths
+    intcode = int_code.get_intcode_from_string(
+        "3,21,1008,21,8,20,1005,20,22,107,8,21,20,1006,20,31,1106,0,36,98,0,0,1002,21,125,20,4,20,1105,1,46,104,999,1105,1,46,1101,1000,1,20,4,20,1105,1,46,98,99"
+    )
+    inputs = list(range(-5, 20))
+    expected = [int_code.run(intcode, i) for i in inputs]
+    assert run_batch(intcode, inputs) == expected
+    # Leaving the batch on overflow
+    intcode = int_code.get_intcode_from_string(
+        "3,13,1002,13,3,13,1007,13,0,14,4,13,99,0,0"
+    )
+    inputs = [1, 2**40, 2**62, -(2**62), -3]
+    expected = [int_code.run(intcode, i) for i in inputs]
+    assert run_batch(intcode, inputs) == expected
+    assert run_batch(intcode, [2**70]) == [int_code.run(intcode, 2**70)]
+    # Leaving the batch on negative addresses
+    intcode = int_code.get_intcode_from_string("3,11,9,11,204,0,99,0,0,0,0,0")
+    inputs = [-1, 2, -3, 5]
+    expected = [int_code.run(intcode, i) for i in inputs]
+    assert run_batch(intcode, inputs) == expected
+    # Parameter sweep
+    intcode = int_code.get_intcode_from_file("day2_input.txt")
+    patches = [{1: noun, 2: verb} for noun in range(100) for verb in range(100)]
+    results = run_batch(intcode, patches=patches, with_final_intcode=False)
+    assert len(results) == 10000
+    for patch, (final, output) in list(zip(patches, results))[::97]:
+        assert run_patched(intcode, None, patch, False) == (final, output)
+    results = run_batch(intcode, patches=patches[::97])
+    assert [final[0] for final, _ in results] == [
+        int_code.run_verb_noun(intcode, p[1], p[2]) for p in patches[::97]
+    ]
+    intcode = int_code.get_intcode_from_file("day9_input.txt")
+    assert (
+        run_batch(intcode, [1, 1], with_final_intcode=False)
+        == [(None, [2457252183])] * 2
+    )
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
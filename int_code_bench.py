@@ -0,0 +1,133 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import argparse
+import json
+import time
+import int_code
+import int_code_compiler
+import int_code_fastforward
+import int_code_profile
+import int_code_programs
+
+
+def get_real_workloads():
+    day2 = int_code.get_intcode_from_file("day2_input.txt")
+    day2[1:3] = [12, 2]
+    day5 = int_code.get_intcode_from_file("day5_input.txt")
+    day9 = int_code.get_intcode_from_file("day9_input.txt")
+    return [
+        ("day2", None, day2, None),
+        ("day5_part1", None, day5, 1),
+        ("day5_part2", None, day5, 5),
+        ("day9_part1", None, day9, 1),
+        ("day9_part2", None, day9, 2),
+    ]
+
+
+def get_synthetic_workloads(scale):
+    return [
+        (name, size, func(size), None)
+        for name, func, size in [
+            ("counting_loop", int_code_programs.counting_loop, int(10000 * scale)),
+            ("relative_loop", int_code_programs.relative_loop, int(10000 * scale)),
+            ("multiply_chain", int_code_programs.multiply_chain, int(1000 * scale)),
+        ]
+    ]
+
+
+# Engines: function taking a program and returning a function running it on an input
+def prepare_reference(intcode):
+    return lambda input_: int_code.run(intcode, input_, with_final_intcode=False)
+
+
+def prepare_decoded(intcode):
+    return lambda input_: int_code.run_decoded(
+        intcode, input_, with_final_intcode=False
+    )
+
+
+def prepare_int64(intcode):
+    return lambda input_: int_code.run_decoded(
+        intcode, input_, with_final_intcode=False, int64=True
+    )
+
+
+def prepare_compiled(intcode):
+    program = int_code_compiler.compile_program(intcode)
+    return lambda input_: program.run(input_, with_final_intcode=False)
+
+
+def prepare_fastforward(intcode):
+    return lambda input_: int_code_fastforward.run_fast_forward(
+        intcode, input_, with_final_intcode=False
+    )
+
+
+engines = {
+    "reference": prepare_reference,
+    "decoded": prepare_decoded,
+    "int64": prepare_int64,
+    "compiled": prepare_compiled,
+    "fastforward": prepare_fastforward,
+}
+
+
+def count_instructions(intcode, input_):
+    _, _, machine = int_code_profile.run_instrumented(intcode, input_)
+    return sum(machine.profile.op_counts.values())
+
+
+def benchmark(workloads, engine_names, repeat):
+    """Yield one result (dict) per workload and engine, with the best of
+    repeat wall times. Outputs are checked against the reference engine."""
+    for name, size, intcode, input_ in workloads:
+        instructions = count_instructions(intcode, input_)
+        expected = int_code.run(intcode, input_)[1]
+        for engine_name in engine_names:
+            begin = time.perf_counter()
+            run = engines[engine_name](intcode)
+            prepare = time.perf_counter() - begin
+            times = []
+            for _ in range(repeat):
+                begin = time.perf_counter()
+                output = run(input_)[1]
+                times.append(time.perf_counter() - begin)
+                assert output == expected
+            seconds = min(times)
+            yield {
+                "workload": name,
+                "size": size,
+                "engine": engine_name,
+                "instructions": instructions,
+                "prepare_seconds": round(prepare, 6),
+                "seconds": round(seconds, 6),
+                "instructions_per_second": round(instructions / seconds),
+            }
+
+
+def run_tests():
+    results = list(benchmark(get_synthetic_workloads(scale=0.01), list(engines), 1))
+    assert len(results) == 3 * len(engines)
+    assert all(json.loads(json.dumps(r)) == r for r in results)
+    assert {r["instructions"] for r in results if r["workload"] == "counting_loop"} == {
+        3 * 100 + 2
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Intcode engines")
+    parser.add_argument("--scale", type=float, default=1, help="synthetic size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engines", nargs="+", default=list(engines))
+    parser.add_argument("--no-real", action="store_true", help="skip dayN inputs")
+    args = parser.parse_args()
+    run_tests()
+    workloads = get_synthetic_workloads(args.scale)
+    if not args.no_real:
+        workloads = get_real_workloads() + workloads
+    # One JSON object per line, keys sorted: easy to diff and to parse
+    for result in benchmark(workloads, args.engines, args.repeat):
+        print(json.dumps(result, sort_keys=True), flush=True)
+
+
+if __name__ == "__main__":
+    main()
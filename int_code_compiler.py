@@ -0,0 +1,318 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import int_code
+
+# Value returned instead of the next position by a block ending with op 99
+HALT = None
+
+
+def decode_at(intcode, pos):
+    """Return op, modes, params for instruction at pos, None if invalid."""
+    if not 0 <= pos < len(intcode):
+        return None
+    try:
+        op, *modes = int_code.parse_op_code(intcode[pos])
+    except AssertionError:
+        return None
+    nb = int_code.nb_params.get(op)
+    if nb is None or pos + nb >= len(intcode):
+        return None
+    modes = modes[:nb]
+    if any(m not in (0, 1, 2) for m in modes):
+        return None
+    if op in (1, 2, 7, 8) and modes[2] == 1 or op == 3 and modes[0] == 1:
+        return None
+    return op, modes, intcode[pos + 1 : pos + 1 + nb]
+
+
+def find_blocks(intcode, starts, known=()):
+    """Return basic blocks by start position, as lists of (pos, instruction).
+
+    Blocks follow the static control flow from the starts and end with a
+    jump, a halt or an instruction that cannot be decoded (instruction
+    None). Targets of position-mode or relative-mode jumps are only known
+    at run time and must be added to the starts. Blocks starting at known
+    positions are not returned."""
+    blocks = dict()
+    todo = list(starts)
+    while todo:
+        start = todo.pop()
+        if start in blocks or start in known or start < 0:
+            continue
+        block = blocks[start] = []
+        pos = start
+        while True:
+            instr = decode_at(intcode, pos)
+            block.append((pos, instr))
+            if instr is None:
+                break
+            op, modes, params = instr
+            if op == 99:
+                break
+            if op in (5, 6):
+                if modes[1] == 1:
+                    todo.append(params[1])
+                if modes[0] != 1 or bool(params[0]) != (op == 5):
+                    todo.append(pos + 3)
+                break
+            pos += len(params) + 1
+    return blocks
+
+
+def get_code_cells(blocks):
+    return frozenset(
+        pos + i
+        for block in blocks.values()
+        for pos, instr in block
+        if instr is not None
+        for i in range(len(instr[2]) + 1)
+    )
+
+
+class BlockWriter:
+    """Python source for the blocks of one program."""
+
+    def __init__(self, intcode, code_cells):
+        self.size = len(intcode)
+        self.code_cells = code_cells
+        self.written = set()  # Position-mode writes: no check at run time
+        self.lines = []
+
+    def emit(self, line, indent=2):
+        self.lines.append("    " * indent + line)
+
+    def read(self, mode, val):
+        if mode == 1:  # Immediate mode
+            return repr(val)
+        elif mode == 0:  # Position mode
+            if 0 <= val < self.size:
+                return "mem[%d]" % val
+            return "read(%d)" % val
+        elif mode == 2:  # Relative mode
+            return "(mem[t] if 0 <= (t := rb + %d) < len(mem) else read(t))" % val
+        else:
+            assert False
+
+    def write(self, mode, val, expr, next_pos):
+        """Emit a write, return whether the block must stop there."""
+        if mode == 0:  # Position mode
+            if 0 <= val < self.size:
+                self.written.add(val)
+                self.emit("mem[%d] = %s" % (val, expr))
+                if val in self.code_cells:
+                    self.emit("blocks.clear()")
+                    self.emit("return %d, rb" % next_pos)
+                    return True
+            else:
+                self.emit("write(%d, %s)" % (val, expr))
+        elif mode == 2:  # Relative mode
+            self.emit("v = %s" % expr)
+            self.emit("t = rb + %d" % val)
+            self.emit("if 0 <= t < len(mem):")
+            self.emit("mem[t] = v", 3)
+            self.emit("else:")
+            self.emit("write(t, v)", 3)
+            self.emit("if t in code:")
+            self.emit("blocks.clear()", 3)
+            self.emit("return %d, rb" % next_pos, 3)
+        else:
+            assert False
+        return False
+
+    def block(self, start, block):
+        self.emit("def block_%d(rb):" % start, 1)
+        for pos, instr in block:
+            if instr is None:
+                # Let the interpreter deal with it
+                self.emit("blocks.clear()")
+                self.emit("return %d, rb" % pos)
+                break
+            op, modes, params = instr
+            next_pos = pos + len(params) + 1
+            args = [self.read(m, p) for m, p in zip(modes, params)]
+            if op == 99:
+                self.emit("return %r, rb" % HALT)
+            elif op in (1, 2, 7, 8):
+                expr = {
+                    1: "%s + %s",
+                    2: "%s * %s",
+                    7: "1 if %s < %s else 0",
+                    8: "1 if %s == %s else 0",
+                }[op] % tuple(args[:2])
+                if self.write(modes[2], params[2], expr, next_pos):
+                    break
+            elif op == 3:
+                if self.write(modes[0], params[0], "get_input()", next_pos):
+                    break
+            elif op == 4:
+                self.emit("output(%s)" % args[0])
+            elif op in (5, 6):
+                # Target read even when not jumping, as in int_code.run
+                self.emit("c = %s" % args[0])
+                self.emit("j = %s" % args[1])
+                cond = "c" if op == 5 else "not c"
+                self.emit("return (j if %s else %d), rb" % (cond, next_pos))
+            elif op == 9:
+                self.emit("rb += %s" % args[0])
+            else:
+                assert False
+        self.emit("blocks[%d] = block_%d" % (start, start), 1)
+
+    def source(self, blocks):
+        self.emit(
+            "def make_blocks(mem, read, write, output, get_input, code, blocks):", 0
+        )
+        for start, block in sorted(blocks.items()):
+            self.block(start, block)
+        return "\n".join(self.lines) + "\n"
+
+
+class CompiledProgram:
+    """Intcode program compiled to one Python function per basic block.
+
+    Compile once, run many times with different inputs. Jumping to a
+    position that was not compiled yet compiles the blocks reached from
+    this new entry point only, unless they contain cells written by the
+    blocks compiled so far: the whole program is recompiled then.
+    Execution goes back to the interpreter when the program writes into
+    its own code."""
+
+    def __init__(self, intcode):
+        self.intcode = list(intcode)
+        self.reset()
+        self.compile({0})
+
+    def reset(self):
+        self.starts = set()
+        self.code_cells = set()
+        self.written = set()
+        self.sources = []
+        self.makers = []
+
+    def compile(self, starts):
+        """Compile the blocks reached from starts that are not compiled yet."""
+        blocks = find_blocks(self.intcode, starts, self.starts)
+        code_cells = get_code_cells(blocks)
+        if code_cells & self.written:
+            # Compiled writes to these cells do not leave the blocks
+            starts = self.starts | set(starts)
+            self.reset()
+            blocks = find_blocks(self.intcode, starts)
+            code_cells = get_code_cells(blocks)
+        self.starts |= blocks.keys()
+        self.code_cells |= code_cells
+        writer = BlockWriter(self.intcode, self.code_cells)
+        source = writer.source(blocks)
+        self.written |= writer.written
+        namespace = dict()
+        exec(compile(source, "<intcode>", "exec"), namespace)
+        self.sources.append(source)
+        self.makers.append(namespace["make_blocks"])
+
+    def run(self, input_=None, with_final_intcode=True):
+        """Same as int_code.run."""
+
+        def get_input():
+            assert input_ is not None
+            return input_
+
+        memory = int_code.Memory(self.intcode)
+        output = []
+        make_blocks_args = (
+            memory.cells,
+            memory.__getitem__,
+            memory.__setitem__,
+            output.append,
+            get_input,
+        )
+        blocks = dict()
+        for make_blocks in self.makers:
+            make_blocks(*make_blocks_args, self.code_cells, blocks)
+        pc, rb = 0, 0
+        while True:
+            block = blocks.get(pc)
+            if block is None:
+                # Blocks are cleared when the program modifies itself
+                if pc is HALT or not blocks or pc < 0:
+                    break
+                makers, nb_makers = self.makers, len(self.makers)
+                code_cells = set(self.code_cells)
+                self.compile({pc})
+                if self.makers is not makers:  # Recompiled from scratch
+                    nb_makers, code_cells = 0, set()
+                    blocks.clear()
+                cells = memory.cells
+                if any(
+                    cells[c] != self.intcode[c] for c in self.code_cells - code_cells
+                ):
+                    # New code was written before being reached: the
+                    # blocks compiled from the original program are stale
+                    break
+                for make_blocks in self.makers[nb_makers:]:
+                    make_blocks(*make_blocks_args, self.code_cells, blocks)
+                continue
+            pc, rb = block(rb)
+        if pc is not HALT:
+            machine = int_code.IntcodeMachine((), int_code.get_inputs(input_))
+            machine.memory = memory
+            machine.pos, machine.relative_base = pc, rb
+            return int_code.run_machine(machine, with_final_intcode, output)
+        final_intcode = memory.to_list() if with_final_intcode else None
+        return final_intcode, output
+
+
+def compile_program(intcode):
+    return CompiledProgram(intcode)
+
+
+def run_compiled(intcode, input_=None, with_final_intcode=True):
+    """Same as int_code.run, compiling the program first."""
+    return compile_program(intcode).run(input_, with_final_intcode)
+
+
+def run_tests():
+    # Jumps to negative positions: never taken, then taken
+    assert run_compiled([1106, 1, -1, 104, 0, 99], 6) == int_code.run(
+        [1106, 1, -1, 104, 0, 99], 6
+    )
+    try:
+        run_compiled([1105, 1, -1, 99])
+        raised = False
+    except AssertionError:  # Same as int_code.run
+        raised = True
+    assert raised
+    # Code written as data, then reached by a dynamic jump
+    intcode = int_code.get_intcode_from_string(
+        "1101,0,104,12,1101,0,42,13,6,16,17,99,1,1,99,0,0,12"
+    )
+    assert run_compiled(intcode) == int_code.run(intcode)
+    # Dynamic jump to a cell written before (with the same value): the
+    # whole program is recompiled, and still run compiled
+    intcode = [1101, 0, 99, 11, 6, 9, 10, 99, 0, 0, 11, 99]
+    program = compile_program(intcode)
+    assert program.run() == int_code.run(intcode)
+    assert len(program.makers) == 1 and 11 in program.code_cells
+    int_code.run_engine_tests(run_compiled)
+    # Same compiled program, different inputs
+    intcode = int_code.get_intcode_from_string(
+        "3,21,1008,21,8,20,1005,20,22,107,8,21,20,1006,20,31,1106,0,36,98,0,0,1002,21,125,20,4,20,1105,1,46,104,999,1105,1,46,1101,1000,1,20,4,20,1105,1,46,98,99"
+    )
+    program = compile_program(intcode)
+    for input_ in range(20):
+        assert program.run(input_) == int_code.run(intcode, input_)
+    for day, inputs in [(5, (1, 5)), (9, (1, 2))]:
+        intcode = int_code.get_intcode_from_file("day%d_input.txt" % day)
+        program = compile_program(intcode)
+        for input_ in inputs:
+            assert program.run(input_) == int_code.run(intcode, input_)
+        # New entry points only compile new blocks, once
+        nb_sources = len(program.sources)
+        assert program.run(inputs[0]) == int_code.run(intcode, inputs[0])
+        assert len(program.sources) == nb_sources
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -0,0 +1,215 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import sys
+import int_code
+import int_code_compiler
+import int_code_profile
+
+
+def format_param(mode, val):
+    if mode == 0:  # Position mode
+        return "[%d]" % val
+    elif mode == 1:  # Immediate mode
+        return "#%d" % val
+    elif mode == 2:  # Relative mode
+        return "[rb%+d]" % val
+    else:
+        assert False
+
+
+def disassemble(intcode, pos):
+    """Return mnemonic and operands for instruction at pos, None if invalid."""
+    instr = int_code_compiler.decode_at(intcode, pos)
+    if instr is None:
+        return None
+    op, modes, params = instr
+    return " ".join(
+        [int_code.mnemonics[op]]
+        + [", ".join(format_param(m, p) for m, p in zip(modes, params))]
+    ).strip()
+
+
+class Block:
+    """Basic block: instructions from start to end (excluded)."""
+
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.instructions = []  # (pos, op, modes, params)
+        self.successors = []
+        self.indirect_jump = False
+        self.self_modifying = []  # positions of stores into the code
+        self.relative_stores = []  # positions of stores at unknown addresses
+        self.hits = 0
+        self.executed = 0
+
+    def __repr__(self):
+        flags = [
+            name
+            for name, flag in [
+                ("indirect", self.indirect_jump),
+                ("self-modifying", self.self_modifying),
+            ]
+            if flag
+        ]
+        return "block %d-%d hits=%d executed=%d -> %s%s" % (
+            self.start,
+            self.end - 1,
+            self.hits,
+            self.executed,
+            ", ".join(str(s) for s in self.successors) or "-",
+            "".join(" [%s]" % f for f in flags),
+        )
+
+
+def get_reachable(intcode, starts):
+    """Return positions of the instructions reachable from starts."""
+    blocks = int_code_compiler.find_blocks(intcode, starts)
+    return {
+        pos: instr
+        for block in blocks.values()
+        for pos, instr in block
+        if instr is not None
+    }
+
+
+def build_cfg(intcode, starts=(0,)):
+    """Return control-flow graph as {start: Block}.
+
+    Only jumps with an immediate target have known successors, the other
+    ones are flagged as indirect: their targets can be given as starts."""
+    reachable = get_reachable(intcode, starts)
+    code_cells = {
+        pos + i
+        for pos, (op, modes, params) in reachable.items()
+        for i in range(len(params) + 1)
+    }
+    leaders = set(starts)
+    for pos, (op, modes, params) in reachable.items():
+        if op in (5, 6):
+            if modes[1] == 1:
+                leaders.add(params[1])
+            if modes[0] != 1 or bool(params[0]) != (op == 5):
+                leaders.add(pos + 3)
+    cfg = dict()
+    for leader in sorted(leaders & set(reachable)):
+        block = cfg[leader] = Block(leader)
+        pos = leader
+        while True:
+            op, modes, params = reachable[pos]
+            block.instructions.append((pos, op, modes, params))
+            next_pos = pos + len(params) + 1
+            # Stores are the last parameter
+            write_mode, write_addr = (
+                (modes[-1], params[-1]) if op in (1, 2, 3, 7, 8) else (None, None)
+            )
+            if write_mode == 0 and write_addr in code_cells:
+                block.self_modifying.append(pos)
+            elif write_mode == 2:
+                block.relative_stores.append(pos)
+            if op == 99:
+                break
+            if op in (5, 6):
+                if modes[1] == 1:
+                    block.successors.append(params[1])
+                else:
+                    block.indirect_jump = True
+                if modes[0] != 1 or bool(params[0]) != (op == 5):
+                    block.successors.append(next_pos)
+                break
+            if next_pos in leaders or next_pos not in reachable:
+                if next_pos in reachable:
+                    block.successors.append(next_pos)
+                break
+            pos = next_pos
+        block.end = next_pos
+    return cfg
+
+
+def build_cfg_from_hits(intcode, pc_hits):
+    """Return control-flow graph with the hit counts of a run attached.
+
+    Executed positions that cannot be reached statically (targets of
+    indirect jumps) are added as starts. Hits on code that only exists at
+    run time are left out."""
+    starts = {0}
+    while True:
+        reachable = get_reachable(intcode, starts)
+        # Code written at run time may not decode statically
+        missing = [pc for pc in pc_hits if pc not in reachable and pc not in starts]
+        if not missing:
+            break
+        starts.add(min(missing))
+    cfg = build_cfg(intcode, sorted(starts))
+    for block in cfg.values():
+        block.hits = pc_hits.get(block.start, 0)
+        block.executed = sum(pc_hits.get(pos, 0) for pos, *_ in block.instructions)
+    return cfg
+
+
+def report(intcode, cfg):
+    """Return blocks sorted by executed instructions, with their code."""
+    lines = []
+    for block in sorted(cfg.values(), key=lambda b: (-b.executed, b.start)):
+        lines.append(repr(block))
+        for pos, *_ in block.instructions:
+            marks = "*" if pos in block.self_modifying else ""
+            lines.append("  %5d: %s%s" % (pos, disassemble(intcode, pos), marks))
+    return "\n".join(lines)
+
+
+def run_tests():
+    intcode = int_code.get_intcode_from_string("1001,20,1,20,1007,20,5,21,1005,21,0,99")
+    assert disassemble(intcode, 0) == "add [20], #1, [20]"
+    assert disassemble(intcode, 11) == "hlt"
+    assert disassemble(int_code.get_intcode_from_string("22201,1,-2,3"), 0) == (
+        "add [rb+1], [rb-2], [rb+3]"
+    )
+    cfg = build_cfg(intcode)
+    assert sorted(cfg) == [0, 11]
+    assert cfg[0].successors == [0, 11]
+    assert cfg[0].end == 11 and not cfg[0].indirect_jump
+    _, _, machine = int_code_profile.run_instrumented(intcode)
+    cfg = build_cfg_from_hits(intcode, machine.profile.pc_hits)
+    assert (cfg[0].hits, cfg[0].executed) == (5, 15)
+    assert (cfg[11].hits, cfg[11].executed) == (1, 1)
+    # Self-modifying store, indirect jump
+    intcode = int_code.get_intcode_from_string(
+        "1101,0,3,100,1,100,100,100,1101,0,2,4,1005,101,22,1101,0,1,101,1105,1,4,4,100,99"
+    )
+    cfg = build_cfg(intcode)
+    assert sorted(cfg) == [0, 4, 15, 22]
+    assert cfg[4].self_modifying == [8]
+    intcode = int_code.get_intcode_from_string("1105,1,5,99,99,6,9,10,99,0,3")
+    cfg = build_cfg(intcode)
+    assert sorted(cfg) == [0, 5, 8]
+    assert cfg[5].indirect_jump and cfg[5].successors == [8]
+    _, _, machine = int_code_profile.run_instrumented(intcode)
+    cfg = build_cfg_from_hits(intcode, machine.profile.pc_hits)
+    assert sorted(cfg) == [0, 3, 5, 8]
+    assert cfg[3].hits == 1 and cfg[8].hits == 0
+    # Real programs with hit counts
+    intcode = int_code.get_intcode_from_file("day9_input.txt")
+    _, _, machine = int_code_profile.run_instrumented(intcode, 1)
+    cfg = build_cfg_from_hits(intcode, machine.profile.pc_hits)
+    assert sum(b.executed for b in cfg.values()) == sum(
+        machine.profile.pc_hits.values()
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Usage: int_code_disasm.py program.txt [input]
+        intcode = int_code.get_intcode_from_file(sys.argv[1])
+        if len(sys.argv) > 2:
+            input_ = int(sys.argv[2])
+            _, _, machine = int_code_profile.run_instrumented(intcode, input_)
+            cfg = build_cfg_from_hits(intcode, machine.profile.pc_hits)
+        else:
+            cfg = build_cfg(intcode)
+        print(report(intcode, cfg))
+    else:
+        begin = datetime.datetime.now()
+        run_tests()
+        end = datetime.datetime.now()
+        print(end - begin)
@@ -0,0 +1,285 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import functools
+import int_code
+import int_code_compiler
+import int_code_programs
+
+# Symbolic values used to analyse one iteration of a loop:
+#  - (CONST, v): same value at every iteration
+#  - (AFFINE, m, k): value of cell m at the start of the iteration, plus k
+#  - (CMP, op, a, b): result of comparing two CONST or AFFINE values
+CONST, AFFINE, CMP = range(3)
+
+
+class NotAffine(Exception):
+    """Loop cannot be fast-forwarded."""
+
+
+def get_loop_body(cells, target, jump_pos):
+    """Return instructions from target to jump_pos (excluded) if they are
+    all additions, multiplications and comparisons, None otherwise."""
+    body = []
+    pos = target
+    while pos < jump_pos and len(body) < 64:
+        instr = int_code_compiler.decode_at(cells, pos)
+        if instr is None or instr[0] not in (1, 2, 7, 8):
+            return None
+        body.append(instr)
+        pos += 4
+    return body if pos == jump_pos else None
+
+
+def combine(op, a, b):
+    if a[0] == CONST and b[0] == CONST:
+        if op == 1:
+            return CONST, a[1] + b[1]
+        elif op == 2:
+            return CONST, a[1] * b[1]
+        elif op == 7:
+            return CONST, 1 if a[1] < b[1] else 0
+        else:
+            return CONST, 1 if a[1] == b[1] else 0
+    if a[0] == CMP or b[0] == CMP:
+        raise NotAffine()
+    if op in (7, 8):
+        return CMP, op, a, b
+    if a[0] == CONST:
+        a, b = b, a
+    if op == 1 and b[0] == CONST:
+        return AFFINE, a[1], a[2] + b[1]
+    if op == 2 and b == (CONST, 1):
+        return a
+    raise NotAffine()
+
+
+def first_non_negative(d, s):
+    """Return first i >= 0 with d + s * i >= 0, None if there is none."""
+    if d >= 0:
+        return 0
+    if s <= 0:
+        return None
+    return (-d + s - 1) // s
+
+
+def get_nb_iterations(op, jump_if, d, s):
+    """Return number of iterations of a loop going on while the comparison
+    (op) of d + s * i with 0 is jump_if at the end of iteration i."""
+    if op == 7:
+        if jump_if:
+            i = first_non_negative(d, s)
+        else:
+            i = first_non_negative(-d - 1, -s)
+    elif jump_if:
+        i = 0 if d != 0 else (1 if s != 0 else None)
+    elif s == 0:
+        i = 0 if d == 0 else None
+    else:
+        i = -d // s if -d % s == 0 and -d // s >= 0 else None
+    return None if i is None else i + 1
+
+
+class FastForwardMachine(int_code.IntcodeMachine):
+    """IntcodeMachine skipping over simple counting loops.
+
+    A loop is a conditional jump back to an immediate target, with only
+    additions, multiplications and comparisons in between. When each cell
+    read before being written in the body is an induction variable (only
+    gets a constant added), the exit test is a linear inequality or
+    equation in the iteration number: the number of iterations and the
+    final value of every cell written are computed directly.
+
+    The final state is exactly the one the loop would have reached, loops
+    that do not fit (or would never end) are simply interpreted. So is
+    everything once the memory is paged (after a snapshot): the analysis
+    needs the cells as a flat list."""
+
+    def __init__(self, intcode, inputs=(), fast_forward=True):
+        super().__init__(intcode, inputs)
+        self.fast_forward = fast_forward
+        self.nb_skipped = 0  # iterations not interpreted
+
+    def fork(self, inputs=()):
+        machine = super().fork(inputs)
+        machine.fast_forward = self.fast_forward
+        machine.nb_skipped = self.nb_skipped
+        return machine
+
+    def decode(self, pos):
+        kind, handler = super().decode(pos)
+        if (
+            not self.fast_forward
+            or not isinstance(self.memory, int_code.Memory)
+            or self.memory[pos] % 100 not in (5, 6)
+        ):
+            return kind, handler
+        instr = int_code_compiler.decode_at(self.memory.cells, pos)
+        if instr is None:
+            return kind, handler
+        op, modes, params = instr
+        if modes[1] != 1 or not 0 <= params[1] < pos:
+            return kind, handler
+        target = params[1]
+        body = get_loop_body(self.memory.cells, target, pos)
+        if body is None:
+            return kind, handler
+        # The body is part of the jump: changing it invalidates the jump
+        for addr in range(target, pos):
+            self.code_cells[addr].add(pos)
+        jump = op, modes, params, pos + 3
+        retry = True
+
+        def fast_forward_jump():
+            nonlocal retry
+            new_pos = handler()
+            if new_pos != target:
+                retry = True
+            elif retry:
+                end = self.skip_loop(target, body, jump)
+                if end is not None:
+                    return end
+                # No point trying again before the loop is left
+                retry = False
+            return new_pos
+
+        self.decoded[pos] = kind, fast_forward_jump
+        return kind, fast_forward_jump
+
+    def skip_loop(self, target, body, jump):
+        """Run all remaining iterations of the loop, return the position
+        after it (None if the loop cannot be fast-forwarded)."""
+        if not isinstance(self.memory, int_code.Memory):
+            return None
+        cells, relative_base = self.memory.cells, self.relative_base
+        code = range(target, jump[3])
+
+        def address(mode, val):
+            addr = val + relative_base if mode == 2 else val
+            if not 0 <= addr < len(cells):
+                raise NotAffine()
+            return addr
+
+        try:
+            dests = [address(modes[2], params[2]) for _, modes, params in body]
+            if any(dest in code for dest in dests):
+                raise NotAffine()
+            written, read_first, env = set(dests), set(), dict()
+
+            def read(mode, val):
+                if mode == 1:
+                    return CONST, val
+                addr = address(mode, val)
+                if addr in env:
+                    return env[addr]
+                if addr in written:
+                    read_first.add(addr)
+                    return AFFINE, addr, 0
+                return CONST, cells[addr]
+
+            for (op, modes, params), dest in zip(body, dests):
+                env[dest] = combine(
+                    op, read(modes[0], params[0]), read(modes[1], params[1])
+                )
+            op, modes, params, end = jump
+            cond = read(modes[0], params[0])
+            steps = {m: env[m][2] for m in written if env[m][:2] == (AFFINE, m)}
+            if not read_first <= steps.keys() or cond[0] == CONST:
+                raise NotAffine()
+        except NotAffine:
+            return None
+
+        def linear(value):
+            """Return (a, s): value is a + s * i at iteration i."""
+            if value[0] == CONST:
+                return value[1], 0
+            return cells[value[1]] + value[2], steps[value[1]]
+
+        jump_if = op == 5
+        if cond[0] == AFFINE:
+            # Jump if the value is not 0: the loop goes on while
+            # "value == 0" is not jump_if
+            cmp_op, (d, s) = 8, linear(cond)
+            jump_if = not jump_if
+        else:
+            _, cmp_op, a, b = cond
+            (a1, s1), (a2, s2) = linear(a), linear(b)
+            d, s = a1 - a2, s1 - s2
+        n = get_nb_iterations(cmp_op, jump_if, d, s)
+        if n is None or n < 2:
+            return None
+
+        def evaluate(value, i):
+            if value[0] == CMP:
+                _, cmp_op, a, b = value
+                a, b = evaluate(a, i), evaluate(b, i)
+                return int(a < b if cmp_op == 7 else a == b)
+            a, s = linear(value)
+            return a + s * i
+
+        # Values written by the last iteration, computed before writing any
+        values = {m: evaluate(v, n - 1) for m, v in env.items()}
+        for addr, value in values.items():
+            self.write(addr, value)
+        self.nb_skipped += n
+        return end
+
+
+def run_fast_forward(intcode, input_=None, with_final_intcode=True, fast_forward=True):
+    """Same as int_code.run, skipping over counting loops."""
+    machine = FastForwardMachine(intcode, int_code.get_inputs(input_), fast_forward)
+    return int_code.run_machine(machine, with_final_intcode)
+
+
+def run_tests():
+    for fast_forward in (True, False):
+        run = functools.partial(run_fast_forward, fast_forward=fast_forward)
+        int_code.run_engine_tests(run)
+    programs = [
+        # Counting loops, with lt or eq, jnz or jz
+        int_code_programs.counting_loop(1000),
+        int_code_programs.counting_loop(0),
+        "1001,16,3,16,1008,16,300,17,1006,17,0,4,16,99,0,0,0,0",
+        "1001,16,-7,16,107,-100,16,17,1005,17,0,4,16,99,0,0,5,0",
+        "1001,16,-7,16,1007,16,-100,17,1006,17,0,4,16,99,0,0,5,0",
+        "1001,16,1,16,1008,16,1,17,1005,17,0,4,16,99,0,0,0,0",
+        # Countdown on the cell itself, with a second induction variable
+        "1101,0,500,20,1001,21,2,21,1001,20,-1,20,1005,20,4,4,21,99,0,0,0,7",
+        # Copies, loop-invariant bound read from memory, relative mode
+        "109,19,21201,1,4,1,1001,20,0,21,22207,1,3,4,1205,4,2,4,21,99,0,0,1000,0",
+        # Multiplication in the body: interpreted
+        int_code_programs.multiply_chain(50),
+        # Body overwriting its code: interpreted
+        "1001,20,2,20,1001,10,1,10,1007,20,50,21,1005,21,0,4,20,99,0,0,0,0",
+    ]
+    for intcode in programs:
+        if isinstance(intcode, str):
+            intcode = int_code.get_intcode_from_string(intcode)
+        for input_ in (None, 3):
+            expected = int_code.run(intcode, input_)
+            assert run_fast_forward(intcode, input_) == expected
+            assert run_fast_forward(intcode, input_, fast_forward=False) == expected
+    machine = FastForwardMachine(int_code_programs.counting_loop(10**12))
+    assert list(machine) == [10**12]
+    assert machine.nb_skipped == 10**12 - 1
+    # Paged memory: interpreted
+    machine = FastForwardMachine(int_code_programs.counting_loop(1000))
+    machine.snapshot()
+    assert list(machine) == [1000] and machine.nb_skipped == 0
+    # Forks are fast-forwarding machines too (interpreting: memory is paged)
+    machine = FastForwardMachine(
+        int_code_programs.counting_loop(10), fast_forward=False
+    )
+    fork = machine.fork()
+    assert isinstance(fork, FastForwardMachine) and not fork.fast_forward
+    assert list(fork) == [10]
+    assert get_nb_iterations(8, False, -5, 2) is None
+    assert get_nb_iterations(7, True, -5, 2) == 3 + 1
+    assert get_nb_iterations(7, False, 5, -2) == 3 + 1
+    assert get_nb_iterations(8, True, 0, 0) is None
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -0,0 +1,289 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import argparse
+import collections
+import functools
+import random
+import signal
+import threading
+import time
+import int_code
+import int_code_compiler
+import int_code_fastforward
+import int_code_profile
+
+try:
+    import int_code_batch
+except ImportError:  # NumPy not available
+    int_code_batch = None
+try:
+    import resource
+except ImportError:  # Not on Unix
+    resource = None
+
+
+# Engines compared with int_code.run: function taking a program and an
+# input, returning final image and output
+def run_paged(intcode, input_):
+    inputs = int_code.get_inputs(input_)
+    return int_code.run_machine(int_code.IntcodeMachine(intcode, inputs, paged=True))
+
+
+engines = {
+    "decoded": int_code.run_decoded,
+    "int64": functools.partial(int_code.run_decoded, int64=True),
+    "paged": run_paged,
+    "budget": int_code.run_with_budget,
+    "cached": int_code.run_cached,
+    "compiled": int_code_compiler.run_compiled,
+    "fastforward": int_code_fastforward.run_fast_forward,
+    "instrumented": int_code_profile.run_profiled,
+}
+if int_code_batch is not None:
+    engines["batch"] = int_code_batch.run_single
+
+
+def random_value(rng, starts):
+    r = rng.random()
+    if r < 0.7:
+        return rng.randint(-10, 10)
+    elif r < 0.85:
+        return rng.choice(starts)
+    else:
+        return rng.choice((-1, 1)) * 2 ** rng.randint(40, 80)
+
+
+def generate_program(rng, nb_instructions=12, data_size=16):
+    """Return random program: nb_instructions instructions then a halt,
+    followed by data cells.
+
+    All addressing modes are used. Most addresses point to the data, some
+    to the code (self-modifying code); relative addresses take the moves
+    of the relative base into account as long as the code runs in order.
+    Jump targets are mostly instruction starts."""
+    ops = [
+        rng.choice((1, 1, 2, 7, 8, 3, 4, 4, 5, 6, 9, 9)) for _ in range(nb_instructions)
+    ]
+    ops.append(99)
+    starts, pos = [], 0
+    for op in ops:
+        starts.append(pos)
+        pos += int_code.nb_params[op] + 1
+    code_size, size = pos, pos + data_size
+    intcode, relative_base = [], 0
+    for op in ops:
+        modes, params = [], []
+        for i in range(int_code.nb_params[op]):
+            is_write = op in (1, 2, 7, 8) and i == 2 or op == 3
+            if op in (5, 6) and i == 1 and rng.random() < 0.8:
+                mode, param = 1, rng.choice(starts)
+            elif op == 9 and rng.random() < 0.8:
+                mode, param = 1, rng.randint(-5, 5)
+                relative_base += param
+            else:
+                mode = rng.choice((0, 2) if is_write else (0, 1, 2))
+                if mode == 1:
+                    param = random_value(rng, starts)
+                else:
+                    in_code = rng.random() < 0.15
+                    addr = rng.randrange(code_size if in_code else size)
+                    if not in_code:
+                        addr = max(addr, code_size)
+                    param = addr if mode == 0 else addr - relative_base
+            modes.append(mode)
+            params.append(param)
+        modes.extend([0] * (3 - len(modes)))
+        intcode.append(op + 100 * modes[0] + 1000 * modes[1] + 10000 * modes[2])
+        intcode.extend(params)
+    intcode.extend(random_value(rng, starts) for _ in range(data_size))
+    return intcode
+
+
+class Timeout(BaseException):
+    """Engine run taking too long (not an Exception: engines must not catch it)."""
+
+
+def call_with_timeout(func, seconds):
+    """Call func, raising Timeout after seconds (when signals can be used)."""
+    if not hasattr(signal, "setitimer") or (
+        threading.current_thread() is not threading.main_thread()
+    ):
+        return func()
+
+    def handler(signum, frame):
+        raise Timeout()
+
+    old_handler = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return func()
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+
+
+def limit_memory(megabytes):
+    """Make allocations past megabytes of address space raise MemoryError
+    instead of getting the process killed: the final image of a program
+    writing far away is huge."""
+    if resource is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (megabytes << 20, hard))
+
+
+def get_outcome(run, intcode, input_, seconds):
+    """Return what running the program gives, errors being all the same.
+    None if memory ran out: there is nothing to compare."""
+    try:
+        final, output = call_with_timeout(lambda: run(list(intcode), input_), seconds)
+        return "halted", final, output
+    except Timeout:
+        return ("timeout",)
+    except MemoryError:
+        return None
+    except Exception:
+        return ("error",)
+
+
+def get_reference_outcome(intcode, input_, budget, seconds=1):
+    """Return outcome with int_code.run, None if it takes more than budget
+    instructions or seconds (the program is then left out: repeated
+    multiplications make huge integers in few instructions)."""
+    try:
+        final, output = call_with_timeout(
+            lambda: int_code.run(list(intcode), input_, max_instructions=budget),
+            seconds,
+        )
+        return "halted", final, output
+    except (int_code.BudgetExceeded, Timeout, MemoryError):
+        return None
+    except Exception:
+        return ("error",)
+
+
+def is_different(engine_name, intcode, input_, budget, seconds):
+    expected = get_reference_outcome(intcode, input_, budget, seconds)
+    if expected is None:
+        return False
+    outcome = get_outcome(engines[engine_name], intcode, input_, seconds)
+    return outcome is not None and outcome != expected
+
+
+def shrink(intcode, is_failing):
+    """Return smaller program still failing: cells are removed (in smaller
+    and smaller chunks) then values are made smaller, until nothing changes."""
+    changed = True
+    while changed:
+        changed = False
+        size = max(1, len(intcode) // 2)
+        while size:
+            start = 0
+            while start < len(intcode):
+                candidate = intcode[:start] + intcode[start + size :]
+                if is_failing(candidate):
+                    intcode, changed = candidate, True
+                else:
+                    start += size
+            size //= 2
+        for i, value in enumerate(intcode):
+            for smaller in (0, 1, value // 2):
+                if abs(smaller) < abs(value):
+                    candidate = intcode[:i] + [smaller] + intcode[i + 1 :]
+                    if is_failing(candidate):
+                        intcode, changed = candidate, True
+                        break
+    return intcode
+
+
+def fuzz(
+    count, seed=0, nb_instructions=12, engine_names=None, budget=1000, seconds=0.2
+):
+    """Compare engines with int_code.run on count random programs, each
+    run being limited to budget instructions (reference) and seconds.
+
+    Return (differences, times, nb_checked): differences by engine name as
+    (number of programs, first program shrunk, its input), times as total
+    seconds by engine on the programs checked."""
+    engine_names = list(engines) if engine_names is None else engine_names
+    rng = random.Random(seed)
+    differences, times, nb_checked = dict(), collections.Counter(), 0
+    for _ in range(count):
+        intcode = generate_program(rng, nb_instructions)
+        input_ = rng.randint(-10, 10)
+        begin = time.perf_counter()
+        expected = get_reference_outcome(intcode, input_, budget, seconds)
+        if expected is None:
+            continue
+        times["reference"] += time.perf_counter() - begin
+        nb_checked += 1
+        for name in engine_names:
+            begin = time.perf_counter()
+            outcome = get_outcome(engines[name], intcode, input_, seconds)
+            times[name] += time.perf_counter() - begin
+            if outcome is None or outcome == expected:
+                continue
+            if name in differences:
+                nb, shrunk, shrunk_input = differences[name]
+                differences[name] = nb + 1, shrunk, shrunk_input
+            else:
+                shrunk = shrink(
+                    intcode,
+                    lambda p: is_different(name, p, input_, budget, seconds),
+                )
+                differences[name] = 1, shrunk, input_
+    return differences, times, nb_checked
+
+
+def report(differences, times, nb_checked):
+    lines = ["%d programs checked" % nb_checked]
+    for name, (nb, intcode, input_) in sorted(differences.items()):
+        lines.append(
+            "%s differs on %d programs, for instance %s with input %d"
+            % (name, nb, ",".join(map(str, intcode)), input_)
+        )
+    for name, seconds in sorted(times.items(), key=lambda item: item[1]):
+        lines.append(
+            "%-12s %8.3fs %6.2fx reference"
+            % (name, seconds, seconds / times["reference"])
+        )
+    return "\n".join(lines)
+
+
+def run_tests():
+    rng = random.Random(0)
+    intcode = generate_program(rng)
+    assert generate_program(random.Random(0)) == intcode
+    assert intcode[-17] == 99
+    differences, times, nb_checked = fuzz(100)
+    assert nb_checked > 50
+    assert differences == dict(), differences
+    assert set(times) == set(engines) | {"reference"}
+    # Broken engine: last output missing
+    engines["broken"] = lambda intcode, input_: (
+        lambda final, output: (final, output[:-1])
+    )(*int_code.run(intcode, input_))
+    try:
+        differences, _, _ = fuzz(20, engine_names=["broken"])
+        nb, intcode, input_ = differences["broken"]
+        assert nb > 1 and len(intcode) <= 8
+        assert is_different("broken", intcode, input_, budget=1000, seconds=1)
+    finally:
+        del engines["broken"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential fuzzing of engines")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", type=int, default=12, help="instructions")
+    parser.add_argument("--budget", type=int, default=1000, help="instructions")
+    parser.add_argument("--engines", nargs="+", default=list(engines))
+    parser.add_argument("--memory", type=int, default=1024, help="megabytes")
+    args = parser.parse_args()
+    limit_memory(args.memory)
+    run_tests()
+    results = fuzz(args.count, args.seed, args.size, args.engines, args.budget)
+    print(report(*results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import array
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import int_code
+
+# Image layout, all little-endian:
+#  - header: magic, version, number of cells, number of escapes
+#  - payload: one signed 64-bit integer per cell
+#  - escapes: for each cell not fitting in 64 bits (stored as 0 in the
+#    payload), its address, its length in bytes and its two's complement
+#    big-endian representation
+MAGIC = b"ICIM"
+VERSION = 1
+header = struct.Struct("<4sIQQ")
+escape_header = struct.Struct("<QQ")
+
+
+def to_payload(intcode):
+    """Return payload array and escapes as {address: value}."""
+    escapes = {
+        addr: v
+        for addr, v in enumerate(intcode)
+        if not int_code.INT64_MIN <= v <= int_code.INT64_MAX
+    }
+    payload = array.array(
+        "q", (0 if a in escapes else v for a, v in enumerate(intcode))
+    )
+    if sys.byteorder == "big":
+        payload.byteswap()
+    return payload, escapes
+
+
+def write_image(intcode, file_path):
+    payload, escapes = to_payload(intcode)
+    with open(file_path, "wb") as f:
+        f.write(header.pack(MAGIC, VERSION, len(payload), len(escapes)))
+        payload.tofile(f)
+        for addr, v in sorted(escapes.items()):
+            data = v.to_bytes((v.bit_length() + 8) // 8, "big", signed=True)
+            f.write(escape_header.pack(addr, len(data)))
+            f.write(data)
+
+
+def read_header(buf):
+    magic, version, nb_cells, nb_escapes = header.unpack_from(buf)
+    assert magic == MAGIC and version == VERSION
+    return nb_cells, nb_escapes
+
+
+def apply_escapes(intcode, buf, offset, nb_escapes):
+    for _ in range(nb_escapes):
+        addr, length = escape_header.unpack_from(buf, offset)
+        offset += escape_header.size
+        intcode[addr] = int.from_bytes(
+            buf[offset : offset + length], "big", signed=True
+        )
+        offset += length
+
+
+def get_intcode_from_image(file_path):
+    """Load an image as a list: no parsing, the payload is copied as is."""
+    with open(file_path, "rb") as f:
+        buf = f.read()
+    nb_cells, nb_escapes = read_header(buf)
+    payload = array.array("q")
+    payload.frombytes(buf[header.size : header.size + 8 * nb_cells])
+    if sys.byteorder == "big":
+        payload.byteswap()
+    intcode = payload.tolist()
+    apply_escapes(intcode, buf, header.size + 8 * nb_cells, nb_escapes)
+    return intcode
+
+
+def map_image(file_path):
+    """Return memory-mapped payload of an image as a read-only memoryview
+    of signed 64-bit integers: nothing is copied. Only for images without
+    escapes, on little-endian machines."""
+    with open(file_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    nb_cells, nb_escapes = read_header(mapped)
+    assert nb_escapes == 0 and sys.byteorder == "little"
+    return memoryview(mapped)[header.size : header.size + 8 * nb_cells].cast("q")
+
+
+def get_image_path(file_path):
+    return os.path.splitext(file_path)[0] + ".icim"
+
+
+def convert(file_path, image_path=None):
+    """Convert a dayN_input.txt program to an image next to it."""
+    if image_path is None:
+        image_path = get_image_path(file_path)
+    write_image(int_code.get_intcode_from_file(file_path), image_path)
+    return image_path
+
+
+def run_tests():
+    low, high = int_code.INT64_MIN, int_code.INT64_MAX
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test.icim")
+        for intcode in [
+            [],
+            int_code.get_intcode_from_string("1,9,10,3,2,3,11,0,99,30,40,50"),
+            [low, high, low - 1, high + 1, -(3**200), 5**300],
+        ]:
+            write_image(intcode, path)
+            assert get_intcode_from_image(path) == intcode
+        for day in (2, 5, 9):
+            file_path = "day%d_input.txt" % day
+            intcode = int_code.get_intcode_from_file(file_path)
+            path = convert(file_path, os.path.join(tmp, "day%d.icim" % day))
+            assert get_intcode_from_image(path) == intcode
+            if sys.byteorder == "little":
+                view = map_image(path)
+                assert view.tolist() == intcode
+                view.release()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for file_path in sys.argv[1:]:
+            print(convert(file_path))
+    else:
+        begin = datetime.datetime.now()
+        run_tests()
+        end = datetime.datetime.now()
+        print(end - begin)
@@ -0,0 +1,211 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import asyncio
+import int_code
+
+# Outcome of a network run
+HALTED, DEADLOCK = "halted", "deadlock"
+
+
+class Network:
+    """Intcode machines running as asyncio tasks in a single thread.
+
+    Each machine reads from its own bounded asyncio.Queue channel. Its
+    outputs go to the channel of the machine it is connected to, or are
+    collected in outputs if it is not connected to anything (or if that
+    machine has halted). Values left in the channel of a halted machine
+    are collected in undelivered.
+
+    The network is idle when every machine still running is blocked:
+    waiting for input on an empty channel or for room on a full one. The
+    idle_handler (if any) is then called with the network and can inject
+    inputs with send: returning a true value resumes the run, otherwise
+    the run stops with a DEADLOCK outcome."""
+
+    def __init__(self, channel_size=64, idle_handler=None):
+        self.channel_size = channel_size
+        self.idle_handler = idle_handler
+        self.machines = dict()
+        self.channels = dict()
+        self.links = dict()
+        self.outputs = dict()
+        self.undelivered = dict()
+        self.last_output = dict()
+        self.blocked = dict()
+        self.idle = None
+
+    def add_machine(self, name, intcode, inputs=()):
+        """Add a machine, inputs are fed directly without using the channel."""
+        self.machines[name] = int_code.IntcodeMachine(intcode, inputs)
+        self.channels[name] = asyncio.Queue(self.channel_size)
+        self.outputs[name] = []
+        self.undelivered[name] = []
+        self.blocked[name] = None
+
+    def connect(self, src, dst):
+        self.links[src] = dst
+
+    def send(self, name, value):
+        self.channels[name].put_nowait(value)
+
+    def drain(self, name):
+        """Move values left in the channel of a halted machine to undelivered."""
+        channel = self.channels[name]
+        while not channel.empty():
+            self.undelivered[name].append(channel.get_nowait())
+
+    def is_idle(self):
+        for name, machine in self.machines.items():
+            if machine.state != int_code.HALTED:
+                blocked = self.blocked[name]
+                if blocked is None:
+                    return False
+                how, channel = blocked
+                if channel.empty() if how == "get" else channel.full():
+                    continue
+                return False
+        return True
+
+    async def wait_on(self, name, how, channel, value=None):
+        self.blocked[name] = how, channel
+        if self.is_idle():
+            self.idle.set()
+        try:
+            if how == "get":
+                return await channel.get()
+            await channel.put(value)
+        finally:
+            self.blocked[name] = None
+
+    async def run_machine(self, name):
+        machine = self.machines[name]
+        channel = self.channels[name]
+        while True:
+            for value in machine:
+                self.last_output[name] = value
+                dst = self.links.get(name)
+                if dst is None or self.machines[dst].state == int_code.HALTED:
+                    self.outputs[name].append(value)
+                else:
+                    dst_channel = self.channels[dst]
+                    if dst_channel.full():
+                        await self.wait_on(name, "put", dst_channel, value)
+                    else:
+                        dst_channel.put_nowait(value)
+                # Let other machines run
+                await asyncio.sleep(0)
+            if machine.state == int_code.HALTED:
+                # Also frees machines waiting for room in the channel
+                self.drain(name)
+                break
+            if channel.empty():
+                value = await self.wait_on(name, "get", channel)
+            else:
+                value = channel.get_nowait()
+            machine.feed([value])
+        if self.is_idle():
+            self.idle.set()
+
+    async def run(self):
+        """Run until all machines halt or the network is idle for good."""
+        self.idle = asyncio.Event()
+        tasks = [asyncio.create_task(self.run_machine(n)) for n in self.machines]
+        done = asyncio.gather(*tasks)
+        try:
+            while True:
+                idle = asyncio.create_task(self.idle.wait())
+                await asyncio.wait({done, idle}, return_when=asyncio.FIRST_COMPLETED)
+                idle.cancel()
+                if done.done():
+                    done.result()
+                    return HALTED
+                self.idle.clear()
+                if not self.is_idle():
+                    continue
+                if self.idle_handler is None or not self.idle_handler(self):
+                    return DEADLOCK
+        finally:
+            done.cancel()
+            await asyncio.gather(done, return_exceptions=True)
+            for name, machine in self.machines.items():
+                if machine.state == int_code.HALTED:
+                    self.drain(name)
+
+
+def run_network(network):
+    return asyncio.run(network.run())
+
+
+def run_amplifiers(intcode, phases, feedback=False):
+    """Chain of amplifiers, looping back from the last one if feedback."""
+    network = Network()
+    names = list(range(len(phases)))
+    for name, phase in zip(names, phases):
+        network.add_machine(name, intcode, [phase])
+    for src, dst in zip(names, names[1:]):
+        network.connect(src, dst)
+    if feedback:
+        network.connect(names[-1], names[0])
+    network.send(names[0], 0)
+    assert run_network(network) == HALTED
+    return network.last_output[names[-1]]
+
+
+def run_tests():
+    intcode = int_code.get_intcode_from_string(
+        "3,15,3,16,1002,16,10,16,1,16,15,15,4,15,99,0,0"
+    )
+    assert run_amplifiers(intcode, [4, 3, 2, 1, 0]) == 43210
+    intcode = int_code.get_intcode_from_string(
+        "3,26,1001,26,-4,26,3,27,1002,27,2,27,1,27,26,27,4,27,1001,28,-1,28,1005,28,6,99,0,0,5"
+    )
+    assert run_amplifiers(intcode, [9, 8, 7, 6, 5], feedback=True) == 139629729
+    # Machines waiting for each other
+    intcode = int_code.get_intcode_from_string("3,9,4,9,1105,1,0,99,0,0")
+    network = Network()
+    network.add_machine("a", intcode)
+    network.add_machine("b", intcode)
+    network.connect("a", "b")
+    network.connect("b", "a")
+    assert run_network(network) == DEADLOCK
+    # Idle machine getting inputs from the idle handler
+    intcode = int_code.get_intcode_from_string("3,11,1001,11,1,11,4,11,1105,1,0,0")
+    injected = []
+
+    def inject(network):
+        if len(injected) < 3:
+            injected.append(len(injected))
+            network.send("a", len(injected))
+            return True
+        return False
+
+    network = Network(channel_size=1, idle_handler=inject)
+    network.add_machine("a", intcode)
+    assert run_network(network) == DEADLOCK
+    assert network.outputs["a"] == [2, 3, 4]
+    # Many machines in a single thread
+    intcode = int_code.get_intcode_from_string("3,9,101,1,9,9,4,9,99,0")
+    network = Network()
+    names = list(range(500))
+    for name in names:
+        network.add_machine(name, intcode)
+    for src, dst in zip(names, names[1:]):
+        network.connect(src, dst)
+    network.send(names[0], 0)
+    assert run_network(network) == HALTED
+    assert network.outputs[names[-1]] == [500]
+    # Values sent to a machine reading a single one before halting
+    network = Network()
+    network.add_machine("a", int_code.get_intcode_from_string("104,1,104,2,104,3,99"))
+    network.add_machine("b", int_code.get_intcode_from_string("3,5,4,5,99,0"))
+    network.connect("a", "b")
+    assert run_network(network) == HALTED
+    assert network.outputs["b"] == [1]
+    assert network.undelivered["b"] + network.outputs["a"] == [2, 3]
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -0,0 +1,142 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import argparse
+import collections
+import concurrent.futures
+import functools
+import itertools
+import json
+import os
+import sys
+import tempfile
+import int_code
+import int_code_image
+import input_files
+
+# Jobs and results are JSON objects, one per line:
+#  - job: {"id": any, "program": path} or {"id": any, "intcode": "1,0,0,0,99"}
+#    (string or list of integers), with optional "inputs" (list of integers)
+#    and "max_instructions"
+#  - result: {"id": any, "state": "halted", "output": [...]}, with "error"
+#    and state "stopped" or "error" when the run did not complete
+# Programs named by path can be text files or images (.icim).
+
+
+@functools.lru_cache(maxsize=64)
+def load_program(kind, source):
+    """Return program as a tuple, parsed once per worker process."""
+    if kind == "program":
+        if source.endswith(".icim"):
+            return tuple(int_code_image.get_intcode_from_image(source))
+        return tuple(int_code.get_intcode_from_file(source))
+    elif kind == "intcode":
+        if isinstance(source, str):
+            return tuple(int_code.get_intcode_from_string(source))
+        return source
+    else:
+        assert False
+
+
+def run_job(line):
+    """Run the job described by a JSON line, return its result."""
+    result = {"id": None}
+    try:
+        job = json.loads(line)
+        result["id"] = job.get("id")
+        if "program" in job:
+            intcode = load_program("program", job["program"])
+        else:
+            source = job["intcode"]
+            intcode = load_program(
+                "intcode", source if isinstance(source, str) else tuple(source)
+            )
+        budget = int_code.Budget(max_instructions=job.get("max_instructions"))
+        machine = int_code.BudgetedMachine(intcode, job.get("inputs", ()), budget)
+        output = []
+        try:
+            output.extend(machine)
+        except int_code.BudgetExceeded as e:
+            result["error"] = str(e)
+        result["state"] = machine.state
+        result["output"] = output
+    except Exception as e:
+        result["state"] = "error"
+        result["error"] = "%s: %s" % (type(e).__name__, e)
+    return result
+
+
+def run_chunk(lines):
+    return [run_job(line) for line in lines]
+
+
+def run_jobs(lines, workers=None, chunk_size=16):
+    """Yield results for the JSON lines, in the same order.
+
+    Lines are sent to the workers in chunks and at most a few chunks per
+    worker are in flight: results are streamed as soon as the jobs before
+    them are done, without reading the whole input first."""
+    workers = workers or os.cpu_count() or 1
+    lines = (line for line in lines if line.strip())
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        pending = collections.deque()
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if chunk:
+                pending.append(executor.submit(run_chunk, chunk))
+            if pending and (not chunk or len(pending) >= 4 * workers):
+                yield from pending.popleft().result()
+            elif not chunk:
+                return
+
+
+def run_tests():
+    day9 = input_files.get_path("day9_input.txt")
+    jobs = [
+        {"id": 0, "program": day9, "inputs": [1]},
+        {"id": 1, "intcode": "3,9,8,9,10,9,4,9,99,-1,8", "inputs": [8]},
+        {"id": 2, "intcode": [3, 9, 8, 9, 10, 9, 4, 9, 99, -1, 8], "inputs": [7]},
+        {"id": 3, "intcode": "1105,1,0", "max_instructions": 100},
+        {"id": 4, "intcode": "3,0,99"},
+        {"id": 5, "program": "does_not_exist.txt"},
+        {"id": 6, "program": day9, "inputs": [2]},
+    ]
+    lines = [json.dumps(job) for job in jobs] + ["", "not json"]
+    results = list(run_jobs(lines, workers=2, chunk_size=2))
+    assert [r["id"] for r in results] == [0, 1, 2, 3, 4, 5, 6, None]
+    assert results[0] == {"id": 0, "state": "halted", "output": [2457252183]}
+    assert results[1]["output"] == [1] and results[2]["output"] == [0]
+    assert results[3]["state"] == "stopped" and "limit" in results[3]["error"]
+    assert results[4]["state"] == "waiting"
+    assert results[5]["state"] == results[7]["state"] == "error"
+    assert results[6]["output"] == [70634]
+    # Images, cached programs
+    with tempfile.TemporaryDirectory() as tmp:
+        path = int_code_image.convert(day9, os.path.join(tmp, "day9.icim"))
+        line = json.dumps({"program": path, "inputs": [1]})
+        assert run_job(line)["output"] == [2457252183]
+        hits = load_program.cache_info().hits
+        assert run_job(line)["output"] == [2457252183]
+        assert load_program.cache_info().hits == hits + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Intcode jobs from JSONL")
+    parser.add_argument("files", nargs="+", help="JSONL files, - for stdin")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=16)
+    args = parser.parse_args()
+    for file_path in args.files:
+        f = sys.stdin if file_path == "-" else open(file_path)
+        with f:
+            for result in run_jobs(f, args.workers, args.chunk_size):
+                print(json.dumps(result), flush=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main()
+    else:
+        begin = datetime.datetime.now()
+        run_tests()
+        end = datetime.datetime.now()
+        print(end - begin)
@@ -0,0 +1,174 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import collections
+import json
+import int_code
+
+
+class Profile:
+    """Counters filled by an InstrumentedMachine."""
+
+    def __init__(self):
+        self.op_counts = collections.Counter()
+        self.pc_hits = collections.Counter()
+        self.reads = collections.Counter()
+        self.writes = collections.Counter()
+
+    def copy(self):
+        other = Profile()
+        other.op_counts = self.op_counts.copy()
+        other.pc_hits = self.pc_hits.copy()
+        other.reads = self.reads.copy()
+        other.writes = self.writes.copy()
+        return other
+
+    def to_dict(self):
+        return {
+            "op_counts": {
+                int_code.mnemonics[op]: n for op, n in self.op_counts.items()
+            },
+            "pc_hits": {str(pc): n for pc, n in sorted(self.pc_hits.items())},
+            "reads": dict(self.reads),
+            "writes": dict(self.writes),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def to_collapsed(self, pc_ops):
+        """Return collapsed stacks ("op;pc count" lines) for flame graphs.
+
+        pc_ops gives the op code executed at each pc."""
+        return "\n".join(
+            "%s;%d %d" % (int_code.mnemonics[pc_ops[pc]], pc, n)
+            for pc, n in sorted(self.pc_hits.items())
+        )
+
+
+class InstrumentedMachine(int_code.IntcodeMachine):
+    """IntcodeMachine counting what it does in its profile.
+
+    Decoded handlers and operand accessors are wrapped to do the counting,
+    leaving IntcodeMachine itself unchanged. The callback (if any) is
+    called with machine, pc and op code before each instruction."""
+
+    def __init__(self, intcode, inputs=(), callback=None):
+        super().__init__(intcode, inputs)
+        self.profile = Profile()
+        self.callback = callback
+        self.pc_ops = dict()
+        self.halt_counted = False
+
+    def fork(self, inputs=()):
+        """Return copy with its own profile, counting from the current one."""
+        machine = super().fork(inputs)
+        machine.profile = self.profile.copy()
+        machine.callback = self.callback
+        machine.pc_ops = dict(self.pc_ops)
+        machine.halt_counted = self.halt_counted
+        return machine
+
+    def reader(self, mode, val):
+        read = super().reader(mode, val)
+        reads, name = self.profile.reads, int_code.mode_names[mode]
+
+        def counted_read():
+            reads[name] += 1
+            return read()
+
+        return counted_read
+
+    def writer(self, mode, val):
+        write = super().writer(mode, val)
+        writes, name = self.profile.writes, int_code.mode_names[mode]
+
+        def counted_write(value):
+            writes[name] += 1
+            write(value)
+
+        return counted_write
+
+    def decode(self, pos):
+        kind, handler = super().decode(pos)
+        op = int_code.parse_op_code(self.memory[pos])[0]
+        self.pc_ops[pos] = op
+        if kind == int_code.HALT:
+            return kind, handler
+        op_counts, pc_hits, callback = (
+            self.profile.op_counts,
+            self.profile.pc_hits,
+            self.callback,
+        )
+
+        def counted_handler(*args):
+            op_counts[op] += 1
+            pc_hits[pos] += 1
+            if callback is not None:
+                callback(self, pos, op)
+            return handler(*args)
+
+        self.decoded[pos] = kind, counted_handler
+        return kind, counted_handler
+
+    def __iter__(self):
+        yield from super().__iter__()
+        if self.state == int_code.HALTED and not self.halt_counted:
+            self.halt_counted = True
+            self.profile.op_counts[99] += 1
+            self.profile.pc_hits[self.pos] += 1
+            if self.callback is not None:
+                self.callback(self, self.pos, 99)
+
+    def collapsed(self):
+        return self.profile.to_collapsed(self.pc_ops)
+
+
+def run_instrumented(intcode, input_=None, callback=None):
+    """Same as int_code.run, also returning the InstrumentedMachine."""
+    machine = InstrumentedMachine(intcode, int_code.get_inputs(input_), callback)
+    final_intcode, output = int_code.run_machine(machine)
+    return final_intcode, output, machine
+
+
+def run_profiled(intcode, input_=None, with_final_intcode=True):
+    """Same as int_code.run, with an InstrumentedMachine."""
+    machine = InstrumentedMachine(intcode, int_code.get_inputs(input_))
+    return int_code.run_machine(machine, with_final_intcode)
+
+
+def run_tests():
+    int_code.run_engine_tests(run_profiled)
+    intcode = int_code.get_intcode_from_string("1002,4,3,4,33")
+    final, output, machine = run_instrumented(intcode)
+    profile = machine.profile
+    assert profile.op_counts == {2: 1, 99: 1}
+    assert profile.pc_hits == {0: 1, 4: 1}
+    assert profile.reads == {"position": 1, "immediate": 1}
+    assert profile.writes == {"position": 1}
+    assert json.loads(profile.to_json())["op_counts"] == {"mul": 1, "hlt": 1}
+    assert machine.collapsed() == "mul;0 1\nhlt;4 1"
+    # Counting loop from 0 to 5, with the callback tracing the pcs
+    intcode = int_code.get_intcode_from_string("1001,20,1,20,1007,20,5,21,1005,21,0,99")
+    trace = []
+    final, output, machine = run_instrumented(
+        intcode, callback=lambda m, pc, op: trace.append(pc)
+    )
+    assert final[20] == 5
+    assert machine.profile.pc_hits == {0: 5, 4: 5, 8: 5, 11: 1}
+    assert trace == [0, 4, 8] * 5 + [11]
+    # Forks go on counting on their own
+    intcode = int_code.get_intcode_from_string("3,9,4,9,1105,1,0,99,0,0")
+    machine = InstrumentedMachine(intcode, [1])
+    assert list(machine) == [1]
+    fork = machine.fork([2])
+    assert isinstance(fork, InstrumentedMachine)
+    assert list(fork) == [2]
+    assert fork.profile.op_counts == {3: 2, 4: 2, 5: 2}
+    assert machine.profile.op_counts == {3: 1, 4: 1, 5: 1}
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
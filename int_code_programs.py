@@ -0,0 +1,64 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import int_code
+
+
+# Synthetic programs: scratch cells are put after the code
+def counting_loop(n):
+    """Count from 0 to n in a tight loop, output n."""
+    x, flag = 16, 17
+    return [
+        # 0: loop body
+        1001, x, 1, x,  # x += 1
+        1007, x, n, flag,  # flag = x < n
+        1005, flag, 0,  # loop if flag
+        4, x,  # output x
+        99,
+        0, 0,  # padding
+        0, 0,  # x, flag
+    ]  # fmt: skip
+
+
+def relative_loop(n):
+    """Fill n cells after the program using relative mode, output the last one."""
+    counter, flag, base = 22, 23, 24
+    return [
+        109, base,  # rb = base
+        # 2: loop body
+        22101, 1, -1, 0,  # mem[rb] = mem[rb - 1] + 1
+        109, 1,  # rb += 1
+        1001, counter, 1, counter,  # counter += 1
+        1007, counter, n, flag,  # flag = counter < n
+        1005, flag, 2,  # loop if flag
+        204, -1,  # output mem[rb - 1]
+        99,
+        0, 0,  # counter, flag
+    ]  # fmt: skip
+
+
+def multiply_chain(n):
+    """Multiply by 3 n times, output 3 ** n (a big integer)."""
+    x, counter, flag = 18, 19, 20
+    return [
+        # 0: loop body
+        1002, x, 3, x,  # x *= 3
+        1001, counter, 1, counter,  # counter += 1
+        1007, counter, n, flag,  # flag = counter < n
+        1005, flag, 0,  # loop if flag
+        4, x,  # output x
+        99,
+        1, 0, 0,  # x, counter, flag
+    ]  # fmt: skip
+
+
+def run_tests():
+    assert int_code.run(counting_loop(100))[1] == [100]
+    assert int_code.run(relative_loop(100))[1] == [100]
+    assert int_code.run(multiply_chain(100))[1] == [3**100]
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -0,0 +1,113 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import collections
+import concurrent.futures
+import sys
+from multiprocessing import shared_memory
+import int_code
+import int_code_image
+
+# What workers need to attach to a shared image: small and cheap to pickle
+ImageHandle = collections.namedtuple("ImageHandle", "name nb_cells escapes")
+
+
+# Segments attached by this process, by name: attached once, kept open
+attached = dict()
+
+
+class SharedImage:
+    """Program image stored once in shared memory as signed 64-bit integers
+    (values not fitting are in the escapes of the handle).
+
+    The creating process owns the segment: close it (or use the image as a
+    context manager) once the workers are done."""
+
+    def __init__(self, intcode):
+        assert sys.byteorder == "little"
+        payload, escapes = int_code_image.to_payload(intcode)
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=max(1, 8 * len(payload))
+        )
+        self.shm.buf[: 8 * len(payload)] = payload.tobytes()
+        self.handle = ImageHandle(self.shm.name, len(payload), escapes)
+        attached[self.shm.name] = self.shm
+
+    def close(self):
+        del attached[self.shm.name]
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_cells(handle):
+    """Return the cells of a shared image as a memoryview: nothing is copied."""
+    shm = attached.get(handle.name)
+    if shm is None:
+        # Processes started by multiprocessing share the resource tracker
+        # of the creating process: the segment is removed by its close only
+        shm = shared_memory.SharedMemory(handle.name)
+        attached[handle.name] = shm
+    return shm.buf[: 8 * handle.nb_cells].cast("q")
+
+
+def attach(handle):
+    """Return PagedMemory using the shared image as read-only backing pages:
+    a page is only copied the first time the program writes into it."""
+    cells = get_cells(handle)
+    memory = int_code.PagedMemory()
+    for n, start in enumerate(range(0, handle.nb_cells, int_code.PAGE_SIZE)):
+        page = cells[start : start + int_code.PAGE_SIZE]
+        if len(page) < int_code.PAGE_SIZE:
+            # Last page: copied to have the full size
+            page = page.tolist() + [0] * (int_code.PAGE_SIZE - len(page))
+            memory.owned.add(n)
+        memory.pages[n] = page
+    memory.size = handle.nb_cells
+    for addr, value in handle.escapes.items():
+        memory[addr] = value
+    return memory
+
+
+def get_machine(handle, inputs=()):
+    machine = int_code.IntcodeMachine((), inputs, paged=True)
+    machine.memory = attach(handle)
+    return machine
+
+
+def run_shared(handle, input_=None, with_final_intcode=True):
+    """Same as int_code.run on a shared image."""
+    machine = get_machine(handle, int_code.get_inputs(input_))
+    return int_code.run_machine(machine, with_final_intcode)
+
+
+def run_tests():
+    intcode = int_code.get_intcode_from_string("1,9,10,3,2,3,11,0,99,30,40,50")
+    with SharedImage(intcode) as image:
+        assert run_shared(image.handle) == int_code.run(intcode)
+        # Copy-on-write: the shared image is left as it was
+        assert get_cells(image.handle).tolist() == intcode
+    with SharedImage([]) as image:
+        assert get_machine(image.handle).memory.to_list() == []
+    intcode = [104, 2**70, 104, -(2**63), 99] + list(range(1000))
+    with SharedImage(intcode) as image:
+        assert run_shared(image.handle) == int_code.run(intcode)
+    intcode = int_code.get_intcode_from_file("day9_input.txt")
+    with SharedImage(intcode) as image:
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            results = list(
+                executor.map(run_shared, [image.handle] * 4, [1, 2, 1, 2], [False] * 4)
+            )
+        assert results == [(None, [2457252183]), (None, [70634])] * 2
+        assert get_cells(image.handle).tolist() == intcode
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -0,0 +1,244 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import itertools
+import collections
+import int_code
+
+
+class SymbolicError(Exception):
+    """Program behaviour depends on the symbols in an unsupported way."""
+
+
+class Polynomial:
+    """Polynomial with integer coefficients over named symbols.
+
+    Terms are stored as {monomial: coefficient} where a monomial is a
+    sorted tuple of symbol names (repeated for powers), () for constants."""
+
+    def __init__(self, terms):
+        self.terms = {m: c for m, c in terms.items() if c}
+
+    @classmethod
+    def symbol(cls, name):
+        return cls({(name,): 1})
+
+    def __add__(self, other):
+        if isinstance(other, Unknown):
+            return other
+        terms = collections.Counter(self.terms)
+        for m, c in as_polynomial(other).terms.items():
+            terms[m] += c
+        return simplify(Polynomial(terms))
+
+    __radd__ = __add__
+
+    def __mul__(self, other):
+        if isinstance(other, Unknown):
+            return other
+        terms = collections.Counter()
+        for (m1, c1), (m2, c2) in itertools.product(
+            self.terms.items(), as_polynomial(other).terms.items()
+        ):
+            terms[tuple(sorted(m1 + m2))] += c1 * c2
+        return simplify(Polynomial(terms))
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        return self.terms == as_polynomial(other).terms
+
+    def __hash__(self):
+        return hash(frozenset(self.terms.items()))
+
+    def __repr__(self):
+        return " + ".join(
+            "*".join([str(c)] + list(m)) if c != 1 or not m else "*".join(m)
+            for m, c in sorted(self.terms.items())
+        )
+
+    def substitute(self, values):
+        """Replace the symbols with a value in values."""
+        ret = 0
+        for m, c in self.terms.items():
+            term = c
+            for s in m:
+                term *= values[s] if s in values else Polynomial.symbol(s)
+            ret += term
+        return ret
+
+
+def as_polynomial(value):
+    return value if isinstance(value, Polynomial) else Polynomial({(): value})
+
+
+def simplify(poly):
+    """Return constant polynomials as int."""
+    terms = poly.terms
+    if not terms:
+        return 0
+    if list(terms) == [()]:
+        return terms[()]
+    return poly
+
+
+class Unknown:
+    """Value read at an address depending on the symbols."""
+
+    def __add__(self, other):
+        return self
+
+    __radd__ = __mul__ = __rmul__ = __add__
+
+    def __repr__(self):
+        return "?"
+
+
+UNKNOWN = Unknown()
+
+
+def is_concrete(value):
+    return isinstance(value, int)
+
+
+def get_address(intcode, pos, mode, relative_base):
+    val = intcode[pos]
+    if not is_concrete(val):
+        raise SymbolicError("Symbolic parameter at %d" % pos)
+    if mode == 0:  # Position mode
+        return val
+    elif mode == 2:  # Relative mode
+        return val + relative_base
+    else:
+        assert False
+
+
+def get_value(intcode, pos, mode, relative_base):
+    if mode == 1:  # Immediate mode
+        return intcode[pos]
+    try:
+        return intcode[get_address(intcode, pos, mode, relative_base)]
+    except SymbolicError:
+        return UNKNOWN
+
+
+def get_concrete_value(intcode, pos, mode, relative_base):
+    val = get_value(intcode, pos, mode, relative_base)
+    if not is_concrete(val):
+        raise SymbolicError("Value %s used for control flow at %d" % (val, pos))
+    return val
+
+
+def run_symbolic(intcode, symbols, inputs=()):
+    """Run program with the cells in symbols (position to name) unknown.
+
+    Arithmetic builds polynomials over the symbols, a value read at an
+    address depending on them is UNKNOWN. Comparisons, jumps, relative
+    base changes and write addresses must not depend on the symbols
+    (SymbolicError otherwise). Return final intcode and output as run."""
+    intcode = int_code.Memory(intcode)
+    for pos, name in symbols.items():
+        intcode[pos] = Polynomial.symbol(name)
+    inputs = iter(inputs)
+    output = []
+    pos, relative_base = 0, 0
+    while True:
+        op_code = intcode[pos]
+        if not is_concrete(op_code):
+            raise SymbolicError("Symbolic op code at %d" % pos)
+        op, mode1, mode2, mode3 = int_code.parse_op_code(op_code)
+        if op == 99:
+            return intcode.to_list(), output
+        elif op in (1, 2):  # Addition, Multiplication
+            a = get_value(intcode, pos + 1, mode1, relative_base)
+            b = get_value(intcode, pos + 2, mode2, relative_base)
+            addr = get_address(intcode, pos + 3, mode3, relative_base)
+            intcode[addr] = a + b if op == 1 else a * b
+            pos += 4
+        elif op == 3:  # Save-input
+            addr = get_address(intcode, pos + 1, mode1, relative_base)
+            intcode[addr] = next(inputs)
+            pos += 2
+        elif op == 4:  # Output
+            output.append(get_value(intcode, pos + 1, mode1, relative_base))
+            pos += 2
+        elif op in (5, 6):  # Jump-if-true, Jump-if-false
+            a = get_concrete_value(intcode, pos + 1, mode1, relative_base)
+            b = get_concrete_value(intcode, pos + 2, mode2, relative_base)
+            pos = b if bool(a) == (op == 5) else pos + 3
+        elif op in (7, 8):  # Less-then, Equals
+            a = get_concrete_value(intcode, pos + 1, mode1, relative_base)
+            b = get_concrete_value(intcode, pos + 2, mode2, relative_base)
+            addr = get_address(intcode, pos + 3, mode3, relative_base)
+            intcode[addr] = int(a < b if op == 7 else a == b)
+            pos += 4
+        elif op == 9:  # Relative base
+            relative_base += get_concrete_value(intcode, pos + 1, mode1, relative_base)
+            pos += 2
+        else:
+            assert False
+
+
+def solve(expr, target, ranges):
+    """Yield assignments (as dicts) of the symbols in ranges so that expr
+    equals target. The last symbol is solved directly when expr is affine
+    in it, the others are enumerated."""
+    if isinstance(expr, Unknown):
+        raise SymbolicError("Cannot solve unknown value")
+    names = list(ranges)
+    *enumerated, last = names
+    for values in itertools.product(*(ranges[n] for n in enumerated)):
+        values = dict(zip(enumerated, values))
+        rest = as_polynomial(as_polynomial(expr).substitute(values))
+        if any(m.count(last) > 1 for m in rest.terms):
+            candidates = ranges[last]
+        else:
+            coef = rest.terms.get((last,), 0)
+            const = rest.terms.get((), 0)
+            if coef == 0:
+                candidates = ranges[last] if const == target else []
+            else:
+                q, r = divmod(target - const, coef)
+                candidates = [q] if r == 0 and q in ranges[last] else []
+        for v in candidates:
+            values[last] = v
+            if as_polynomial(expr).substitute(values) == target:
+                yield dict(values)
+
+
+def run_tests():
+    intcode = int_code.get_intcode_from_string("1,9,10,3,2,3,11,0,99,30,40,50")
+    final, output = run_symbolic(intcode, {9: "a", 10: "b", 11: "c"})
+    assert final[0] == Polynomial({("a", "c"): 1, ("b", "c"): 1})
+    assert output == []
+    # Symbols used as addresses only matter if the value read is kept
+    intcode = int_code.get_intcode_from_string("1,0,0,3,1,1,2,3,2,3,11,0,99,0,0,0")
+    final, _ = run_symbolic(intcode, {1: "noun", 2: "verb"})
+    assert final[0] == 0
+    intcode = int_code.get_intcode_from_string("1,0,0,3,1,1,2,3,2,3,12,0,99,0")
+    final, _ = run_symbolic(intcode, {1: "noun", 2: "verb"})
+    assert final[0] == Polynomial({("noun",): 99, ("verb",): 99})
+    solutions = list(solve(final[0], 99 * 42, {"noun": range(100), "verb": range(100)}))
+    assert len(solutions) == 43
+    assert all(s["noun"] + s["verb"] == 42 for s in solutions)
+    for noun, verb in [(0, 0), (4, 7), (12, 2)]:
+        expected = int_code.run_verb_noun(intcode, noun, verb)
+        assert final[0].substitute({"noun": noun, "verb": verb}) == expected
+    # Polynomial expressions
+    intcode = int_code.get_intcode_from_string("2,5,5,0,99,0")
+    final, _ = run_symbolic(intcode, {5: "x"})
+    assert final[0] == Polynomial({("x", "x"): 1})
+    assert list(solve(final[0], 49, {"x": range(-10, 10)})) == [{"x": -7}, {"x": 7}]
+    # Control flow depending on symbols
+    intcode = int_code.get_intcode_from_string("1005,5,4,99,99,0")
+    try:
+        run_symbolic(intcode, {5: "x"})
+        assert False
+    except SymbolicError:
+        pass
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)
@@ -23,9 +23,6 @@ sed -i "s/DAYNUMBER/${day}/g" "${script_file}"
 # Add line to README.md
 echo -e "\n${puzzle_url} : 0/2" >> README.md
 
-# Change number of days in all_days.py
-sed -i "s/^\(nb_days = \).*/\1${day}/g" all_days.py
-
 # Add everything and commit
 git add "${input_file}" "${script_file}" README.md
 git commit -m "Day ${day} - part 1"
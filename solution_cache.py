@@ -0,0 +1,169 @@
+# vi: set shiftwidth=4 tabstop=4 expandtab:
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import types
+
+directory = os.path.dirname(os.path.abspath(__file__))
+default_cache_dir = os.path.join(directory, ".solution_cache")
+
+
+def hash_file(path, h, chunk_size=1 << 16):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+
+
+def get_local_modules(module, found=None):
+    """Return module and the modules of this directory it imports, directly
+    or not: the source they all make up gives the answers."""
+    found = dict() if found is None else found
+    found[module.__name__] = module
+    for value in vars(module).values():
+        if (
+            isinstance(value, types.ModuleType)
+            and value.__name__ not in found
+            and os.path.dirname(getattr(value, "__file__", None) or "") == directory
+        ):
+            get_local_modules(value, found)
+    return found
+
+
+def get_key(module):
+    """Return hash of the input file of a dayN module (if any) and of the
+    source of the modules it uses."""
+    h = hashlib.sha256()
+    for name, mod in sorted(get_local_modules(module).items()):
+        h.update(name.encode() + b"\0")
+        hash_file(mod.__file__, h)
+    input_path = os.path.join(directory, module.__name__ + "_input.txt")
+    if os.path.exists(input_path):
+        h.update(b"input\0")
+        hash_file(input_path, h)
+    return h.hexdigest()
+
+
+class SolutionCache:
+    """Answers stored as one JSON file per key, the least recently used
+    ones being removed past max_entries."""
+
+    def __init__(self, cache_dir=default_cache_dir, max_entries=64):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        """Return cached answers, None if there are none."""
+        path = self.get_path(key)
+        try:
+            with open(path) as f:
+                answers = json.load(f)["answers"]
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)  # Most recently used
+        except FileNotFoundError:
+            pass  # Evicted by another process in the meantime
+        return answers
+
+    def put(self, key, name, answers):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"module": name, "answers": answers}, f)
+        os.replace(tmp_path, self.get_path(key))
+        self.evict()
+
+    def evict(self):
+        # Processes running days in parallel can evict at the same time:
+        # files can disappear at any point
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    pass
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries :]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get_answers(self, module, force=False):
+        """Return answers of the parts of a dayN module, computed only if
+        force is set or the input or the code changed since last time."""
+        key = get_key(module)
+        if not force:
+            answers = self.get(key)
+            if answers is not None:
+                return answers
+        answers = [part() for part in module.get_parts()]
+        # Answers not surviving JSON unchanged (tuples...) are not cached
+        if json.loads(json.dumps(answers)) == answers:
+            self.put(key, module.__name__, answers)
+        return answers
+
+
+solution_cache = SolutionCache()
+
+
+def run_tests():
+    import day1
+    import day2
+    import int_code
+
+    modules = get_local_modules(day2)
+    assert {"day2", "int_code", "int_code_symbolic", "benchmark"} <= modules.keys()
+    assert "itertools" not in modules
+    assert get_key(day2) == get_key(day2) != get_key(day1)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = SolutionCache(tmp_dir, max_entries=2)
+        answers = cache.get_answers(day1)
+        assert answers == [part() for part in day1.get_parts()]
+        # Cached: parts are not called
+        get_parts, day1.get_parts = day1.get_parts, None
+        try:
+            assert cache.get_answers(day1) == answers
+        finally:
+            day1.get_parts = get_parts
+        assert cache.get(get_key(day2)) is None
+        # Least recently used removed
+        for key in "abc":
+            cache.put(key, "day0", [key])
+            cache.get("a")
+        assert cache.get("a") == ["a"] and cache.get("c") == ["c"]
+        assert cache.get(get_key(day1)) is None and cache.get("b") is None
+        assert sorted(os.listdir(tmp_dir)) == ["a.json", "c.json"]
+        # Another process removing the same files first
+        remove = os.remove
+
+        def racing_remove(path):
+            remove(path)
+            remove(path)
+
+        os.remove = racing_remove
+        try:
+            cache.put("d", "day0", ["d"])
+        finally:
+            os.remove = remove
+        assert sorted(os.listdir(tmp_dir)) == ["c.json", "d.json"]
+        # Not cached
+        module = types.ModuleType("day0")
+        module.get_parts = lambda: [lambda: (1, 2)]
+        module.__file__ = int_code.__file__
+        assert cache.get_answers(module) == [(1, 2)]
+        assert cache.get(get_key(module)) is None
+
+
+if __name__ == "__main__":
+    begin = datetime.datetime.now()
+    run_tests()
+    end = datetime.datetime.now()
+    print(end - begin)